@@ -1,85 +1,131 @@
 import os
 import uuid
-import time
-from flask import Flask, request, jsonify, send_file, redirect, url_for, session, render_template, flash
+import hmac
+import tempfile
+from flask import Flask, Blueprint, Response, current_app, request, jsonify, send_file, redirect, url_for, session, render_template, flash
 from werkzeug.utils import secure_filename
+from werkzeug.wsgi import wrap_file
 from dotenv import load_dotenv
-from utils.database import db
-from models import User, DocumentHistory, Session as SessionModel, EmailConfig, SystemConfig
+
+# Antes dos módulos da aplicação: utils/* lê as configurações do ambiente ao ser importado
+load_dotenv()
+
+from utils.database import db, database_uri
+from utils.db_pool import engine_options, pool_metrics
+from models import User, DocumentHistory, Session as SessionModel, EmailConfig, SystemConfig, Job
 from auth.entra_id import get_auth_url, get_token_from_code, get_user_info, login_required, get_mfa_auth_url
 from auth.local_auth import local_auth
-from utils.file_processor import allowed_file, process_docx, process_xlsx, process_pdf
+from utils.file_processor import allowed_file, PDF_EXTRACTORS, get_cell_cache_stats
+from utils.documents import mask_document, unmask_document, restored_filename
+from utils.jobs import enqueue_job, job_file_path, start_job_workers
+from utils.outbox import start_outbox_sender
+from utils.config_cache import notify_config_changed, start_config_listener
+from utils.admin_queries import history_page, users_page
+from utils.usage_stats import usage_stats
+from utils.batch import save_batch_inputs, mask_batch, unmask_batch, BatchTooLargeError
 from utils.cleanup import start_cleanup_scheduler
 from datetime import datetime
+from sqlalchemy import text
 
-load_dotenv()
+# Rotas da aplicação; registradas em cada instância criada por create_app
+main = Blueprint('main', __name__)
+
+def create_app(config=None):
+    # Apenas configuração: nenhuma conexão com o banco, arquivo ou thread é aberto
+    # aqui, então importar o módulo e criar a aplicação é imediato. O esquema é
+    # criado por migrate_db.py e os serviços em segundo plano por
+    # start_background_services.
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY')
+    app.config['UPLOAD_FOLDER'] = 'uploads'
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri()
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    if config:
+        app.config.update(config)
+    # Calculadas depois de config, a partir da URI final do banco
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+    
+    # Inicializar o banco de dados
+    db.init_app(app)
+    
+    # Registrar blueprints da autenticação local e das rotas principais. A ordem
+    # importa: GET /login de local_auth tem precedência sobre o de main.
+    app.register_blueprint(local_auth)
+    app.register_blueprint(main)
+    
+    return app
+
+def start_background_services(app):
+    # Executado uma vez em cada processo que atende requisições (no gunicorn,
+    # depois do fork de cada worker, já que threads não sobrevivem ao fork)
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    
+    # Scheduler de limpeza (arquivos temporários e sessões expiradas)
+    start_cleanup_scheduler(app)
+    
+    # Workers de jobs em segundo plano
+    start_job_workers(app)
+    
+    # Envio de e-mails da caixa de saída em segundo plano
+    start_outbox_sender(app)
+    
+    # Avisos de alteração de configurações feitas por outros processos
+    start_config_listener(app)
 
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY')
-app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['SQLALCHEMY_DATABASE_URI'] = (
-    f"postgresql://{os.environ.get('POSTGRES_USER', 'postgres')}:"
-    f"{os.environ.get('POSTGRES_PASSWORD', 'postgres')}@"
-    f"{os.environ.get('POSTGRES_HOST', 'db')}:"
-    f"{os.environ.get('POSTGRES_PORT', '5432')}/"
-    f"{os.environ.get('POSTGRES_DB', 'masking_app')}"
-)
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# Inicializar o banco de dados
-db.init_app(app)
-
-# Registrar blueprint de autenticação local
-app.register_blueprint(local_auth)
-
-# Criar diretório de uploads se não existir
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-
-# Esperar o banco de dados estar pronto
-def wait_for_db():
-    max_retries = 10
-    retry_count = 0
-    
-    while retry_count < max_retries:
-        try:
-            with app.app_context():
-                db.engine.connect()
-                print("Banco de dados está pronto!")
-                return True
-        except Exception as e:
-            print(f"Tentativa {retry_count + 1}/{max_retries}: Aguardando banco de dados... Erro: {e}")
-            retry_count += 1
-            time.sleep(5)
-    
-    print("Não foi possível conectar ao banco de dados após várias tentativas.")
-    return False
-
-# Aguardar o banco de dados estar pronto antes de criar as tabelas
-if wait_for_db():
-    with app.app_context():
-        db.create_all()
-        print("Tabelas criadas com sucesso!")
-else:
-    print("Não foi possível criar as tabelas. O banco de dados não está disponível.")
-
-# Iniciar o scheduler de limpeza
-scheduler = start_cleanup_scheduler(app.config['UPLOAD_FOLDER'])
+# Verificações de saúde: /healthz indica que o processo está de pé (liveness);
+# /readyz, que consegue atender requisições (readiness)
+@main.route('/healthz')
+def healthz():
+    return jsonify({"status": "ok"})
+
+@main.route('/readyz')
+def readyz():
+    try:
+        db.session.execute(text('SELECT 1'))
+    except Exception:
+        db.session.rollback()
+        return jsonify({"status": "unavailable", "database": "sem conexão"}), 503
+    if not os.path.isdir(current_app.config['UPLOAD_FOLDER']):
+        return jsonify({"status": "unavailable", "uploads": "diretório ausente"}), 503
+    return jsonify({"status": "ok"})
+
+# Endpoints de métricas: acessíveis a administradores logados ou, com
+# METRICS_TOKEN definido, pelo cabeçalho "Authorization: Bearer <token>"
+def metrics_access_allowed():
+    if 'user' in session and session['user']['is_admin']:
+        return True
+    token = os.environ.get('METRICS_TOKEN')
+    return bool(token) and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+
+# Métricas do pool de conexões do processo que atende a requisição
+@main.route('/metrics/db-pool')
+def db_pool_metrics():
+    if not metrics_access_allowed():
+        return jsonify({"error": "Acesso negado"}), 403
+    return jsonify(pool_metrics.snapshot(db.engine.pool))
+
+# Acertos e falhas do cache de células das planilhas neste processo
+@main.route('/metrics/cell-cache')
+def cell_cache_metrics():
+    if not metrics_access_allowed():
+        return jsonify({"error": "Acesso negado"}), 403
+    return jsonify(dict(get_cell_cache_stats(), pid=os.getpid()))
 
 # Rotas de autenticação
-@app.route('/login')
+@main.route('/login')
 def login():
     # Verificar se o usuário já está autenticado
     if 'user' in session:
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     
     return render_template('login_choice.html')
 
-@app.route('/auth/entra-id/callback')
+@main.route('/auth/entra-id/callback')
 def entra_id_callback():
     auth_code = request.args.get('code')
     if not auth_code:
         flash('Erro: código de autorização não encontrado', 'error')
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     
     token_result = get_token_from_code(auth_code)
     if 'error' in token_result:
@@ -89,16 +135,16 @@ def entra_id_callback():
         if 'MFA' in error_description or 'strong authentication' in error_description:
             session['mfa_required'] = True
             flash('Autenticação de múltiplos fatores necessária. Por favor, tente novamente.', 'warning')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         
         flash(f'Erro ao obter token: {error_description}', 'error')
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     
     user_info = get_user_info(token_result['access_token'])
     if 'error' in user_info:
         error_description = user_info.get('error_description', 'Erro desconhecido')
         flash(f'Erro ao obter informações do usuário: {error_description}', 'error')
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     
     # Verificar se o usuário existe no banco de dados
     user = User.query.filter_by(entra_id=user_info['id']).first()
@@ -125,31 +171,31 @@ def entra_id_callback():
     # Resetar flag de MFA
     session.pop('mfa_required', None)
     
-    return redirect(url_for('dashboard'))
+    return redirect(url_for('main.dashboard'))
 
-@app.route('/logout')
+@main.route('/logout')
 def logout():
     session.pop('user', None)
     session.pop('mfa_required', None)
     session.pop('mfa_verify_user_id', None)
     session.pop('mfa_setup_user_id', None)
     flash('Você foi desconectado com sucesso', 'success')
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
-@app.route('/')
+@main.route('/')
 def index():
     if 'user' in session:
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     return render_template('login_choice.html')
 
-@app.route('/dashboard')
+@main.route('/dashboard')
 @login_required
 def dashboard():
     if session['user']['is_admin']:
-        return redirect(url_for('admin_dashboard'))
-    return redirect(url_for('user_dashboard'))
+        return redirect(url_for('main.admin_dashboard'))
+    return redirect(url_for('main.user_dashboard'))
 
-@app.route('/user/dashboard')
+@main.route('/user/dashboard')
 @login_required
 def user_dashboard():
     # Buscar os últimos 10 documentos do usuário
@@ -161,19 +207,14 @@ def user_dashboard():
     
     return render_template('user_dashboard.html', history=history)
 
-@app.route('/admin/dashboard')
+@main.route('/admin/dashboard')
 @login_required
 def admin_dashboard():
     # Verificar se é administrador
     if not session['user']['is_admin']:
-        return redirect(url_for('user_dashboard'))
+        return redirect(url_for('main.user_dashboard'))
     
-    # Buscar todos os usuários
-    users = User.query.all()
-    
-    # Buscar todos os documentos (apenas metadados) com os dados do usuário carregados
-    from sqlalchemy.orm import joinedload
-    history = DocumentHistory.query.options(joinedload(DocumentHistory.user)).order_by(DocumentHistory.timestamp.desc()).all()
+    # Usuários e histórico são carregados pela página, em partes, via /admin/api/users e /admin/api/history
     
     # Buscar configuração de e-mail
     email_config = EmailConfig.query.first()
@@ -181,10 +222,29 @@ def admin_dashboard():
     # Buscar configuração do sistema
     system_config = SystemConfig.query.first()
     
-    return render_template('admin_dashboard.html', users=users, history=history, email_config=email_config, system_config=system_config)
+    # Detectores disponíveis e habilitados
+    from utils.detectors import DETECTORS
+    from utils.system_config import get_enabled_detectors
+    
+    return render_template('admin_dashboard.html', email_config=email_config, system_config=system_config, detectors=DETECTORS.values(), enabled_detectors=get_enabled_detectors())
+
+# Tamanho dos blocos enviados ao cliente nas respostas com arquivos processados
+RESPONSE_CHUNK_SIZE = int(os.environ.get('RESPONSE_CHUNK_SIZE_KB', '64')) * 1024
+
+def send_processed_file(file, download_name, mimetype='application/octet-stream'):
+    # O arquivo (temporário em memória ou em disco) é enviado em blocos, sem ser
+    # carregado inteiro na memória, com o Content-Length calculado de antemão
+    file.seek(0, os.SEEK_END)
+    size = file.tell()
+    file.seek(0)
+    
+    response = Response(wrap_file(request.environ, file, RESPONSE_CHUNK_SIZE), mimetype=mimetype, direct_passthrough=True)
+    response.content_length = size
+    response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+    return response
 
 # Rotas da API
-@app.route('/mask', methods=['POST'])
+@main.route('/mask', methods=['POST'])
 @login_required
 def mask_data():
     if 'file' not in request.files:
@@ -200,57 +260,21 @@ def mask_data():
     if not allowed_file(file.filename):
         return jsonify({"error": "Formato de arquivo não suportado"}), 400
     
-    filename = secure_filename(file.filename)
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    file.save(file_path)
-    
-    session_id = str(uuid.uuid4())
-    session_data = {}
+    # Modo de extração de PDF opcional por requisição ('accurate' ou 'fast')
+    pdf_mode = request.form.get('pdf_mode') or None
+    if pdf_mode and pdf_mode not in PDF_EXTRACTORS:
+        return jsonify({"error": "Modo de extração de PDF inválido"}), 400
     
+    filename = secure_filename(file.filename)
     file_ext = filename.rsplit('.', 1)[1].lower()
     
     try:
-        if file_ext == 'docx':
-            processed_file = process_docx(file_path, mask_words, session_data, is_masking=True)
-        elif file_ext == 'xlsx':
-            processed_file = process_xlsx(file_path, mask_words, session_data, is_masking=True)
-        elif file_ext == 'pdf':
-            processed_file = process_pdf(file_path, mask_words, session_data, is_masking=True)
-        
-        # Salvar sessão no banco de dados
+        # O documento é lido direto do stream do upload, sem cópia para a pasta de uploads
         user_id = session['user']['id']
-        db_session = SessionModel(
-            session_id=session_id,
-            user_id=user_id,
-            original_filename=filename,
-            file_format=file_ext,
-            mappings=session_data
-        )
-        db.session.add(db_session)
-        
-        # Registrar no histórico
-        history_record = DocumentHistory(
-            user_id=user_id,
-            filename=filename,
-            file_format=file_ext,
-            operation='mask',
-            session_id=session_id
-        )
-        db.session.add(history_record)
-        db.session.commit()
-        
-        # Enviar e-mail com informações do documento
-        from utils.email_sender import send_document_email
-        user = User.query.get(user_id)
-        send_document_email(user, filename, 'mascarado', session_id)
+        processed_file, session_id = mask_document(file.stream, filename, file_ext, mask_words, user_id, pdf_mode)
         
         # Retornar arquivo processado e o ID da sessão
-        response = send_file(
-            processed_file,
-            as_attachment=True,
-            download_name=f"masked_{filename}",
-            mimetype='application/octet-stream'
-        )
+        response = send_processed_file(processed_file, f"masked_{filename}", 'application/octet-stream')
         
         # Adicionar cabeçalho com o ID da sessão
         response.headers['X-Session-ID'] = session_id
@@ -260,7 +284,7 @@ def mask_data():
     except Exception as e:
         return jsonify({"error": f"Erro ao processar arquivo: {str(e)}"}), 500
 
-@app.route('/unmask', methods=['POST'])
+@main.route('/unmask', methods=['POST'])
 @login_required
 def unmask_data():
     if 'file' not in request.files or 'session_id' not in request.form:
@@ -269,8 +293,13 @@ def unmask_data():
     file = request.files['file']
     session_id = request.form['session_id']
     
+    # Modo de extração de PDF opcional por requisição ('accurate' ou 'fast')
+    pdf_mode = request.form.get('pdf_mode') or None
+    if pdf_mode and pdf_mode not in PDF_EXTRACTORS:
+        return jsonify({"error": "Modo de extração de PDF inválido"}), 400
+    
     # Buscar sessão no banco de dados
-    db_session = SessionModel.query.filter_by(session_id=session_id).first()
+    db_session = SessionModel.find_active(session_id)
     if not db_session:
         return jsonify({"error": "Sessão inválida ou expirada"}), 400
     
@@ -278,54 +307,276 @@ def unmask_data():
     if str(db_session.user_id) != session['user']['id'] and not session['user']['is_admin']:
         return jsonify({"error": "Acesso negado"}), 403
     
-    session_data = db_session.mappings
-    original_filename = db_session.original_filename
-    file_format = db_session.file_format
+    if not allowed_file(file.filename):
+        return jsonify({"error": "Formato de arquivo não suportado"}), 400
     
     filename = secure_filename(file.filename)
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    file.save(file_path)
+    file_ext = filename.rsplit('.', 1)[1].lower()
+    original_filename = restored_filename(db_session, filename)
     
     try:
-        if file_format == 'docx':
-            restored_file = process_docx(file_path, [], session_data, is_masking=False)
-        elif file_format == 'xlsx':
-            restored_file = process_xlsx(file_path, [], session_data, is_masking=False)
-        elif file_format == 'pdf':
-            restored_file = process_pdf(file_path, [], session_data, is_masking=False)
-        
-        # Registrar no histórico
-        history_record = DocumentHistory(
-            user_id=db_session.user_id,
-            filename=original_filename,
-            file_format=file_format,
-            operation='unmask',
-            session_id=session_id
-        )
-        db.session.add(history_record)
-        
-        # Remover sessão do banco de dados
-        db.session.delete(db_session)
-        db.session.commit()
-        
-        # Enviar e-mail com informações do documento
-        from utils.email_sender import send_document_email
-        user = User.query.get(db_session.user_id)
-        send_document_email(user, original_filename, 'restaurado', session_id)
+        restored_file = unmask_document(file.stream, filename, file_ext, db_session, pdf_mode)
         
         # Retornar arquivo restaurado
-        return send_file(
-            restored_file,
-            as_attachment=True,
-            download_name=f"restored_{original_filename}",
-            mimetype='application/octet-stream'
-        )
+        return send_processed_file(restored_file, f"restored_{original_filename}", 'application/octet-stream')
     
     except Exception as e:
         return jsonify({"error": f"Erro ao restaurar arquivo: {str(e)}"}), 500
 
+# Rotas de jobs assíncronos
+@main.route('/jobs/mask', methods=['POST'])
+@login_required
+def create_mask_job():
+    if 'file' not in request.files:
+        return jsonify({"error": "Nenhum arquivo enviado"}), 400
+    
+    file = request.files['file']
+    mask_words = request.form.get('mask_words', '').split(',')
+    mask_words = [word.strip() for word in mask_words if word.strip()]
+    
+    if file.filename == '':
+        return jsonify({"error": "Nome de arquivo inválido"}), 400
+    
+    if not allowed_file(file.filename):
+        return jsonify({"error": "Formato de arquivo não suportado"}), 400
+    
+    pdf_mode = request.form.get('pdf_mode') or None
+    if pdf_mode and pdf_mode not in PDF_EXTRACTORS:
+        return jsonify({"error": "Modo de extração de PDF inválido"}), 400
+    
+    filename = secure_filename(file.filename)
+    file_ext = filename.rsplit('.', 1)[1].lower()
+    
+    job = Job(
+        id=uuid.uuid4(),
+        user_id=session['user']['id'],
+        operation='mask',
+        filename=filename,
+        file_format=file_ext,
+        mask_words=mask_words,
+        pdf_mode=pdf_mode
+    )
+    job.input_path = job_file_path(current_app.config['UPLOAD_FOLDER'], job.id, 'input', file_ext)
+    job.result_path = job_file_path(current_app.config['UPLOAD_FOLDER'], job.id, 'result', file_ext)
+    file.save(job.input_path)
+    
+    db.session.add(job)
+    db.session.commit()
+    enqueue_job(job.id)
+    
+    return jsonify({"job_id": str(job.id), "status": job.status}), 202
+
+@main.route('/jobs/unmask', methods=['POST'])
+@login_required
+def create_unmask_job():
+    if 'file' not in request.files or 'session_id' not in request.form:
+        return jsonify({"error": "Arquivo ou ID de sessão não fornecidos"}), 400
+    
+    file = request.files['file']
+    session_id = request.form['session_id']
+    
+    pdf_mode = request.form.get('pdf_mode') or None
+    if pdf_mode and pdf_mode not in PDF_EXTRACTORS:
+        return jsonify({"error": "Modo de extração de PDF inválido"}), 400
+    
+    # Buscar sessão no banco de dados
+    db_session = SessionModel.find_active(session_id)
+    if not db_session:
+        return jsonify({"error": "Sessão inválida ou expirada"}), 400
+    
+    # Verificar se o usuário tem permissão para acessar esta sessão
+    if str(db_session.user_id) != session['user']['id'] and not session['user']['is_admin']:
+        return jsonify({"error": "Acesso negado"}), 403
+    
+    if not allowed_file(file.filename):
+        return jsonify({"error": "Formato de arquivo não suportado"}), 400
+    
+    filename = secure_filename(file.filename)
+    
+    job = Job(
+        id=uuid.uuid4(),
+        user_id=session['user']['id'],
+        operation='unmask',
+        filename=restored_filename(db_session, filename),
+        file_format=filename.rsplit('.', 1)[1].lower(),
+        session_id=session_id,
+        pdf_mode=pdf_mode
+    )
+    job.input_path = job_file_path(current_app.config['UPLOAD_FOLDER'], job.id, 'input', job.file_format)
+    job.result_path = job_file_path(current_app.config['UPLOAD_FOLDER'], job.id, 'result', job.file_format)
+    file.save(job.input_path)
+    
+    db.session.add(job)
+    db.session.commit()
+    enqueue_job(job.id)
+    
+    return jsonify({"job_id": str(job.id), "status": job.status}), 202
+
+def get_job_for_user(job_id):
+    try:
+        job = Job.query.get(uuid.UUID(job_id))
+    except ValueError:
+        return None
+    if job and str(job.user_id) != session['user']['id'] and not session['user']['is_admin']:
+        return None
+    return job
+
+@main.route('/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    job = get_job_for_user(job_id)
+    if not job:
+        return jsonify({"error": "Job não encontrado"}), 404
+    
+    data = job.to_dict()
+    if job.status == 'done':
+        data['download_url'] = url_for('main.job_download', job_id=job_id)
+    return jsonify(data)
+
+@main.route('/jobs/<job_id>/download')
+@login_required
+def job_download(job_id):
+    job = get_job_for_user(job_id)
+    if not job:
+        return jsonify({"error": "Job não encontrado"}), 404
+    
+    if job.status != 'done':
+        return jsonify({"error": "Job ainda não concluído", "status": job.status}), 409
+    
+    if not os.path.exists(job.result_path):
+        return jsonify({"error": "Resultado expirado"}), 410
+    
+    prefix = 'masked' if job.operation == 'mask' else 'restored'
+    response = send_file(
+        job.result_path,
+        as_attachment=True,
+        download_name=f"{prefix}_{job.filename}",
+        mimetype='application/octet-stream'
+    )
+    response.headers['X-Session-ID'] = job.session_id
+    return response
+
+# Rotas de processamento em lote
+@main.route('/batch/mask', methods=['POST'])
+@login_required
+def batch_mask():
+    files = [file for file in request.files.getlist('files') if file.filename]
+    if not files:
+        return jsonify({"error": "Nenhum arquivo enviado"}), 400
+    
+    mask_words = request.form.get('mask_words', '').split(',')
+    mask_words = [word.strip() for word in mask_words if word.strip()]
+    
+    pdf_mode = request.form.get('pdf_mode') or None
+    if pdf_mode and pdf_mode not in PDF_EXTRACTORS:
+        return jsonify({"error": "Modo de extração de PDF inválido"}), 400
+    
+    # Uma sessão compartilhada por todo o lote, em vez de uma por documento
+    shared_mapping = request.form.get('shared_mapping', '').lower() in ('1', 'true', 'on')
+    
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            entries, _ = save_batch_inputs(files, work_dir)
+            if not entries:
+                return jsonify({"error": "Nenhum arquivo em formato suportado"}), 400
+            
+            archive, shared_session_id = mask_batch(entries, work_dir, mask_words, session['user']['id'], pdf_mode, shared_mapping)
+        
+        response = send_processed_file(archive, 'masked_batch.zip', 'application/zip')
+        if shared_session_id:
+            response.headers['X-Session-ID'] = shared_session_id
+        return response
+    
+    except BatchTooLargeError as e:
+        return jsonify({"error": str(e)}), 413
+    except Exception as e:
+        return jsonify({"error": f"Erro ao processar lote: {str(e)}"}), 500
+
+@main.route('/batch/unmask', methods=['POST'])
+@login_required
+def batch_unmask():
+    files = [file for file in request.files.getlist('files') if file.filename]
+    if not files:
+        return jsonify({"error": "Nenhum arquivo enviado"}), 400
+    
+    pdf_mode = request.form.get('pdf_mode') or None
+    if pdf_mode and pdf_mode not in PDF_EXTRACTORS:
+        return jsonify({"error": "Modo de extração de PDF inválido"}), 400
+    
+    # IDs de sessão: 'session_id' único para todos os arquivos, 'session_ids'
+    # separados por vírgula na ordem dos arquivos, ou o manifesto do zip
+    session_id = request.form.get('session_id', '').strip()
+    session_ids = [item.strip() for item in request.form.get('session_ids', '').split(',') if item.strip()]
+    
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            entries, manifest = save_batch_inputs(files, work_dir)
+            if not entries:
+                return jsonify({"error": "Nenhum arquivo em formato suportado"}), 400
+            
+            if session_id:
+                session_ids = [session_id] * len(entries)
+            elif manifest:
+                session_ids = [manifest.get(entry['name']) for entry in entries]
+            if len(session_ids) != len(entries) or not all(session_ids):
+                return jsonify({"error": "Informe um ID de sessão para cada arquivo"}), 400
+            
+            db_sessions = {}
+            for item in set(session_ids):
+                db_session = SessionModel.find_active(item)
+                if not db_session:
+                    return jsonify({"error": f"Sessão inválida ou expirada: {item}"}), 400
+                if str(db_session.user_id) != session['user']['id'] and not session['user']['is_admin']:
+                    return jsonify({"error": "Acesso negado"}), 403
+                db_sessions[item] = db_session
+            
+            archive = unmask_batch(entries, work_dir, [db_sessions[item] for item in session_ids], pdf_mode, manifest)
+        
+        return send_processed_file(archive, 'restored_batch.zip', 'application/zip')
+    
+    except BatchTooLargeError as e:
+        return jsonify({"error": str(e)}), 413
+    except Exception as e:
+        return jsonify({"error": f"Erro ao restaurar lote: {str(e)}"}), 500
+
 # Rotas de administração
-@app.route('/admin/promote/<user_id>', methods=['POST'])
+@main.route('/admin/api/history')
+@login_required
+def admin_api_history():
+    # Verificar se é administrador
+    if not session['user']['is_admin']:
+        return jsonify({"error": "Acesso negado"}), 403
+    
+    try:
+        return jsonify(history_page(request.args))
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+
+@main.route('/admin/api/users')
+@login_required
+def admin_api_users():
+    # Verificar se é administrador
+    if not session['user']['is_admin']:
+        return jsonify({"error": "Acesso negado"}), 403
+    
+    try:
+        return jsonify(users_page(request.args))
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+
+@main.route('/admin/api/stats')
+@login_required
+def admin_api_stats():
+    # Verificar se é administrador
+    if not session['user']['is_admin']:
+        return jsonify({"error": "Acesso negado"}), 403
+    
+    try:
+        return jsonify(usage_stats(request.args))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@main.route('/admin/promote/<user_id>', methods=['POST'])
 @login_required
 def promote_user(user_id):
     # Verificar se é administrador
@@ -340,9 +591,9 @@ def promote_user(user_id):
     db.session.commit()
     
     flash(f"Usuário {user.username} promovido a administrador", "success")
-    return redirect(url_for('admin_dashboard'))
+    return redirect(url_for('main.admin_dashboard'))
 
-@app.route('/admin/demote/<user_id>', methods=['POST'])
+@main.route('/admin/demote/<user_id>', methods=['POST'])
 @login_required
 def demote_user(user_id):
     # Verificar se é administrador
@@ -357,9 +608,9 @@ def demote_user(user_id):
     db.session.commit()
     
     flash(f"Usuário {user.username} rebaixado a usuário comum", "success")
-    return redirect(url_for('admin_dashboard'))
+    return redirect(url_for('main.admin_dashboard'))
 
-@app.route('/admin/approve-user/<user_id>', methods=['POST'])
+@main.route('/admin/approve-user/<user_id>', methods=['POST'])
 @login_required
 def approve_user(user_id):
     # Verificar se é administrador
@@ -380,9 +631,9 @@ def approve_user(user_id):
     db.session.commit()
     
     flash(f"Usuário {user.username} aprovado com sucesso!", "success")
-    return redirect(url_for('admin_dashboard'))
+    return redirect(url_for('main.admin_dashboard'))
 
-@app.route('/admin/reject-user/<user_id>', methods=['POST'])
+@main.route('/admin/reject-user/<user_id>', methods=['POST'])
 @login_required
 def reject_user(user_id):
     # Verificar se é administrador
@@ -404,9 +655,9 @@ def reject_user(user_id):
     db.session.commit()
     
     flash(f"Usuário {user.username} rejeitado e excluído com sucesso!", "success")
-    return redirect(url_for('admin_dashboard'))
+    return redirect(url_for('main.admin_dashboard'))
 
-@app.route('/admin/email-config', methods=['GET', 'POST'])
+@main.route('/admin/email-config', methods=['GET', 'POST'])
 @login_required
 def email_config():
     # Verificar se é administrador
@@ -444,36 +695,49 @@ def email_config():
             db.session.add(config)
         
         db.session.commit()
+        notify_config_changed('email_config')
         flash("Configurações de e-mail salvas com sucesso!", "success")
-        return redirect(url_for('admin_dashboard'))
-    
-    # Buscar configuração do sistema
-    system_config = SystemConfig.query.first()
+        return redirect(url_for('main.admin_dashboard'))
     
-    return render_template('admin_dashboard.html', email_config=config, users=User.query.all(), history=DocumentHistory.query.options(joinedload(DocumentHistory.user)).order_by(DocumentHistory.timestamp.desc()).all(), system_config=system_config)
+    # O formulário de configuração fica no painel administrativo
+    return redirect(url_for('main.admin_dashboard'))
 
-@app.route('/admin/toggle-registration', methods=['POST'])
+@main.route('/admin/toggle-registration', methods=['POST'])
 @login_required
 def toggle_registration():
     # Verificar se é administrador
     if not session['user']['is_admin']:
         return jsonify({"error": "Acesso negado"}), 403
     
-    from utils.system_config import set_local_registration_allowed, is_local_registration_allowed
+    from utils.system_config import set_local_registration_allowed, get_system_config
     
-    # Alternar o estado atual
-    new_state = not is_local_registration_allowed()
+    # Alternar o estado atual (lido do banco, não do cache)
+    new_state = not get_system_config().allow_local_registration
     set_local_registration_allowed(new_state)
     
     status = "ativado" if new_state else "desativado"
     flash(f"Registro de novas contas locais foi {status}!", "success")
-    return redirect(url_for('admin_dashboard'))
+    return redirect(url_for('main.admin_dashboard'))
+
+@main.route('/admin/detectors', methods=['POST'])
+@login_required
+def update_detectors():
+    # Verificar se é administrador
+    if not session['user']['is_admin']:
+        return jsonify({"error": "Acesso negado"}), 403
+    
+    from utils.system_config import set_enabled_detectors
+    
+    set_enabled_detectors(request.form.getlist('detectors'))
+    
+    flash("Detectores de dados sensíveis atualizados com sucesso!", "success")
+    return redirect(url_for('main.admin_dashboard'))
 
-@app.route('/debug-session/<session_id>')
+@main.route('/debug-session/<session_id>')
 @login_required
 def debug_session(session_id):
     # Buscar sessão no banco de dados
-    db_session = SessionModel.query.filter_by(session_id=session_id).first()
+    db_session = SessionModel.find_active(session_id)
     if not db_session:
         return jsonify({"error": "Sessão não encontrada"}), 404
     
@@ -490,4 +754,7 @@ def debug_session(session_id):
     })
 
 if __name__ == '__main__':
+    # Servidor de desenvolvimento; em produção: gunicorn -c gunicorn.conf.py wsgi:app
+    app = create_app()
+    start_background_services(app)
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
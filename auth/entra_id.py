@@ -40,7 +40,7 @@ def get_user_info(token):
 def login_required(f):
     def decorated_function(*args, **kwargs):
         if 'user' not in session:
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         return f(*args, **kwargs)
     decorated_function.__name__ = f.__name__
     return decorated_function
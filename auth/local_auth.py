@@ -165,7 +165,7 @@ def verify_mfa():
             # Limpar sessão temporária
             session.pop('mfa_verify_user_id', None)
             
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('main.dashboard'))
         else:
             flash('Código inválido. Tente novamente.', 'error')
     
@@ -0,0 +1,48 @@
+import os
+import sys
+import time
+import threading
+
+# Adicionar o diretório raiz ao path do Python
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from utils.database import database_uri
+from utils.db_pool import InstrumentedQueuePool, pool_metrics
+
+def run(threads, queries, pool_size, max_overflow, pre_ping):
+    # Várias threads disputando o pool, como as threads de um worker do gunicorn
+    # somadas aos workers de jobs; cada consulta segura a conexão por alguns ms
+    engine = create_engine(database_uri(), poolclass=InstrumentedQueuePool, pool_size=pool_size,
+                           max_overflow=max_overflow, pool_pre_ping=pre_ping)
+    pool_metrics.reset()
+
+    def work():
+        for _ in range(queries):
+            with engine.connect() as connection:
+                connection.execute(text('SELECT pg_sleep(0.002)'))
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    metrics = pool_metrics.snapshot(engine.pool)
+    engine.dispose()
+    wait = metrics['wait_seconds']
+    print(f"{pool_size:>5} {max_overflow:>9} {'sim' if pre_ping else 'não':>9} {threads * queries / elapsed:>12.0f} "
+          f"{wait['sum'] / wait['count'] * 1000:>17.2f} {metrics['connects']:>8}")
+
+def main():
+    threads = int(os.environ.get('BENCH_THREADS', '16'))
+    queries = int(os.environ.get('BENCH_QUERIES', '200'))
+    print(f"{threads} threads, {queries} consultas cada")
+    print(f"{'pool':>5} {'overflow':>9} {'pre-ping':>9} {'consultas/s':>12} {'espera média (ms)':>17} {'conexões':>8}")
+    for pool_size, max_overflow, pre_ping in ((5, 10, False), (5, 10, True), (16, 0, True)):
+        run(threads, queries, pool_size, max_overflow, pre_ping)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+import os
+import re
+import sys
+import resource
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Bibliotecas de documentos que não devem ser importadas no boot de um worker
+DOCUMENT_LIBRARIES = ['openpyxl', 'pdfplumber', 'pdfminer', 'reportlab', 'lxml']
+
+LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+def profile(target):
+    # Equivalente a 'python -X importtime -c "import <target>"', agregando o tempo
+    # próprio de cada módulo pelo pacote de nível superior
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {target}'], cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+
+    packages = {}
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            package = match.group(4).split('.')[0]
+            packages[package] = packages.get(package, 0) + int(match.group(1))
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return packages, peak
+
+def main():
+    target = os.environ.get('BENCH_IMPORT_TARGET', 'app')
+    top = int(os.environ.get('BENCH_IMPORT_TOP', '15'))
+    packages, peak = profile(target)
+
+    print(f"import {target}: {sum(packages.values()) / 1000:.0f} ms, pico de memória {peak:.0f} MB")
+    print(f"{'pacote':>20} {'tempo (ms)':>11}")
+    for package, elapsed in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print(f"{package:>20} {elapsed / 1000:>11.1f}")
+
+    loaded = [library for library in DOCUMENT_LIBRARIES if library in packages]
+    print(f"bibliotecas de documentos importadas: {', '.join(loaded) or 'nenhuma'}")
+
+if __name__ == '__main__':
+    main()
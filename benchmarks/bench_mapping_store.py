@@ -0,0 +1,60 @@
+import os
+import sys
+import time
+import random
+import resource
+import subprocess
+
+# Adicionar o diretório raiz ao path do Python
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.masking_engine import SessionMappings
+from utils.mapping_codec import iter_encoded_mappings, iter_decoded_mappings
+
+def run(entries, memory_budget):
+    # Mascaramento de uma planilha com muitos valores únicos, seguido da
+    # persistência em partes e da restauração de todos os tokens
+    rng = random.Random(42)
+    mappings = SessionMappings(token_mode='reuse', memory_budget=memory_budget)
+
+    start = time.perf_counter()
+    tokens = []
+    for index in range(entries):
+        token = mappings.tokenize('CPF', f"{rng.randrange(10**9):09d}{index % 100:02d}")
+        if index % 100 == 0:
+            tokens.append(token)
+    mask = time.perf_counter() - start
+
+    start = time.perf_counter()
+    chunks = list(iter_encoded_mappings(mappings))
+    persist = time.perf_counter() - start
+
+    start = time.perf_counter()
+    restored = SessionMappings(memory_budget=memory_budget)
+    for batch in iter_decoded_mappings(chunks):
+        restored.update(batch)
+    assert all(restored.get(token) == mappings.get(token) for token in tokens)
+    load = time.perf_counter() - start
+
+    spilled = mappings.spilled
+    mappings.close()
+    restored.close()
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{'disco' if spilled else 'memória':>8} {mask * 1000:>13.0f} {persist * 1000:>13.0f} {load * 1000:>13.0f} {peak:>10.0f}")
+
+def main():
+    entries = int(os.environ.get('BENCH_ENTRIES', '2000000'))
+    budget = os.environ.get('BENCH_MEMORY_BUDGET_MB', '64')
+    print(f"{entries} valores únicos, limite de memória de {budget} MB")
+    print(f"{'modo':>8} {'mascarar (ms)':>13} {'gravar (ms)':>13} {'ler (ms)':>13} {'pico (MB)':>10}")
+
+    # Cada modo em um processo próprio, para medir o pico de memória separadamente
+    for memory_budget in (10**15, int(budget) * 1024 * 1024):
+        subprocess.run([sys.executable, __file__, str(entries), str(memory_budget)], check=True)
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3:
+        run(int(sys.argv[1]), int(sys.argv[2]))
+    else:
+        main()
@@ -0,0 +1,69 @@
+import os
+import re
+import sys
+import time
+import uuid
+import random
+
+# Adicionar o diretório raiz ao path do Python
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.masking_engine import get_masking_engine
+
+def legacy_mask_text(text, mask_words, session_data):
+    # Implementação anterior: um regex por palavra e uma substituição por ocorrência
+    for word in mask_words:
+        pattern = re.compile(re.escape(word), re.IGNORECASE)
+        for match in pattern.findall(text):
+            token = f"[MASKED_{uuid.uuid4().hex[:8]}]"
+            session_data[token] = match
+            text = pattern.sub(token, text)
+
+    cpf_pattern = re.compile(r'\b(\d{3}\.\d{3}\.\d{3}-\d{2})\b')
+    cnpj_pattern = re.compile(r'\b(\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2})\b')
+    for cpf in cpf_pattern.findall(text):
+        token = f"[CPF_{uuid.uuid4().hex[:8]}]"
+        session_data[token] = cpf
+        text = text.replace(cpf, token)
+    for cnpj in cnpj_pattern.findall(text):
+        token = f"[CNPJ_{uuid.uuid4().hex[:8]}]"
+        session_data[token] = cnpj
+        text = text.replace(cnpj, token)
+    return text
+
+def engine_mask_text(text, mask_words, session_data):
+    # Mesmos detectores da implementação anterior, para uma comparação justa
+    return get_masking_engine(mask_words, ('CPF', 'CNPJ')).mask(text, session_data)
+
+def make_cells(words, count):
+    rng = random.Random(42)
+    filler = ['contrato', 'cliente', 'valor', 'pago', 'pendente', 'ativo', 'referente', 'ao', 'mês']
+    cells = []
+    for _ in range(count):
+        parts = rng.choices(filler, k=8)
+        if words and rng.random() < 0.3:
+            parts.insert(rng.randrange(len(parts)), rng.choice(words))
+        if rng.random() < 0.1:
+            parts.append(f"{rng.randrange(1000):03d}.{rng.randrange(1000):03d}.{rng.randrange(1000):03d}-{rng.randrange(100):02d}")
+        cells.append(' '.join(parts))
+    return cells
+
+def run(func, cells, words):
+    session_data = {}
+    start = time.perf_counter()
+    for cell in cells:
+        func(cell, words, session_data)
+    return time.perf_counter() - start
+
+def main():
+    cell_count = int(os.environ.get('BENCH_CELLS', '10000'))
+    print(f"{'palavras':>9} {'anterior (s)':>13} {'motor (s)':>10} {'ganho':>7}")
+    for word_count in (1, 10, 50, 200, 500):
+        words = [f"empresa{i} ltda" for i in range(word_count)]
+        cells = make_cells(words, cell_count)
+        legacy = run(legacy_mask_text, cells, words)
+        engine = run(engine_mask_text, cells, words)
+        print(f"{word_count:>9} {legacy:>13.3f} {engine:>10.3f} {legacy / engine:>6.1f}x")
+
+if __name__ == '__main__':
+    main()
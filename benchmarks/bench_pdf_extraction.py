@@ -0,0 +1,44 @@
+import os
+import sys
+import time
+import random
+import tempfile
+
+# Adicionar o diretório raiz ao path do Python
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import A4
+from utils.file_processor import PDF_EXTRACTORS
+
+def make_pdf(path, pages):
+    rng = random.Random(42)
+    words = ['contrato', 'cliente', 'valor', 'pagamento', 'cláusula', 'empresa', 'prazo', 'multa', 'rescisão']
+    pdf = canvas.Canvas(path, pagesize=A4)
+    for page in range(pages):
+        y = 800
+        while y > 40:
+            line = ' '.join(rng.choices(words, k=10))
+            if rng.random() < 0.2:
+                line += f" CPF {rng.randrange(1000):03d}.{rng.randrange(1000):03d}.{rng.randrange(1000):03d}-{rng.randrange(100):02d}"
+            pdf.drawString(40, y, line)
+            y -= 14
+        pdf.showPage()
+    pdf.save()
+
+def main():
+    pages = int(os.environ.get('BENCH_PAGES', '300'))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bench.pdf')
+        make_pdf(path, pages)
+        print(f"{pages} páginas, {os.path.getsize(path) / 1024:.0f} KB")
+        print(f"{'modo':>9} {'tempo (s)':>10} {'págs/s':>8} {'caracteres':>11}")
+        for mode, extractor in PDF_EXTRACTORS.items():
+            start = time.perf_counter()
+            texts = extractor(path, 0, pages)
+            elapsed = time.perf_counter() - start
+            characters = sum(len(text or '') for text in texts)
+            print(f"{mode:>9} {elapsed:>10.2f} {pages / elapsed:>8.1f} {characters:>11}")
+
+if __name__ == '__main__':
+    main()
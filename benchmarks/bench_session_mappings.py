@@ -0,0 +1,55 @@
+import os
+import sys
+import json
+import time
+import random
+
+# Adicionar o diretório raiz ao path do Python
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.masking_engine import SessionMappings
+from utils.mapping_codec import encode_mappings, decode_mappings
+
+def make_mappings(entries):
+    # Mapeamentos parecidos com os de uma planilha grande: CPFs, e-mails e nomes
+    rng = random.Random(42)
+    names = ['Maria', 'João', 'Ana', 'José', 'Francisca', 'Antônio', 'Carlos', 'Paulo']
+    mappings = SessionMappings(token_mode='reuse')
+    for index in range(entries):
+        kind = index % 3
+        if kind == 0:
+            mappings.tokenize('CPF', f"{rng.randrange(10**9):09d}{rng.randrange(100):02d}")
+        elif kind == 1:
+            mappings.tokenize('EMAIL', f"{rng.choice(names).lower()}.{index}@empresa.com.br")
+        else:
+            mappings.tokenize('MASKED', f"{rng.choice(names)} {rng.choice(names)} da Silva {index}")
+    return dict(mappings.items())
+
+def measure(function, *args, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+def main():
+    entries = int(os.environ.get('BENCH_ENTRIES', '200000'))
+    mappings = make_mappings(entries)
+    print(f"{len(mappings)} mapeamentos")
+    print(f"{'formato':>9} {'tamanho (KB)':>13} {'gravação (ms)':>14} {'leitura (ms)':>13}")
+
+    # Coluna JSON anterior: serialização completa na gravação e na leitura
+    data, write = measure(lambda: json.dumps(mappings).encode('utf-8'))
+    loaded, read = measure(json.loads, data)
+    assert loaded == mappings
+    print(f"{'json':>9} {len(data) / 1024:>13.0f} {write * 1000:>14.1f} {read * 1000:>13.1f}")
+
+    data, write = measure(encode_mappings, mappings)
+    loaded, read = measure(decode_mappings, data)
+    assert loaded == mappings
+    print(f"{'binário':>9} {len(data) / 1024:>13.0f} {write * 1000:>14.1f} {read * 1000:>13.1f}")
+
+if __name__ == '__main__':
+    main()
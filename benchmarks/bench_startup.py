@@ -0,0 +1,33 @@
+import os
+import sys
+import time
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Etapas medidas em um processo Python novo, como no boot de um worker
+STEPS = {
+    'import app': 'import app',
+    'create_app()': 'from app import create_app; create_app()',
+}
+
+def measure(code, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True)
+        elapsed = time.perf_counter() - start
+        if result.returncode != 0:
+            return None
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    repeat = int(os.environ.get('BENCH_REPEAT', '5'))
+    print(f"{'etapa':>14} {'tempo (ms)':>11}")
+    for name, code in STEPS.items():
+        elapsed = measure(code, repeat)
+        print(f"{name:>14} {'erro' if elapsed is None else f'{elapsed * 1000:.0f}':>11}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+import os
+import multiprocessing
+from dotenv import load_dotenv
+
+# GUNICORN_* também podem vir do .env fora do Docker
+load_dotenv()
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+
+# Mascaramento e restauração usam CPU, então um processo por núcleo; as threads
+# atendem em paralelo as requisições leves (páginas, status de jobs, verificações
+# de saúde) sem bloquear atrás de um documento em processamento
+workers = int(os.environ.get('GUNICORN_WORKERS') or multiprocessing.cpu_count())
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+
+# Documentos grandes processados de forma síncrona podem levar alguns minutos
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '300'))
+graceful_timeout = 30
+keepalive = 5
+
+# Reciclar os workers periodicamente limita o crescimento de memória
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '1000'))
+max_requests_jitter = max_requests // 10
+
+# A aplicação é importada uma vez no processo mestre e compartilhada com os
+# workers (copy-on-write); create_app não abre conexões, então nada é herdado
+preload_app = True
+
+accesslog = '-'
+
+def post_fork(server, worker):
+    # Threads não sobrevivem ao fork: cada worker inicia os próprios serviços
+    from wsgi import app
+    from app import start_background_services
+    start_background_services(app)
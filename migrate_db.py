@@ -1,7 +1,12 @@
 import os
 import sys
+from dotenv import load_dotenv
+
+# Antes dos módulos da aplicação, que leem as configurações ao serem importados
+load_dotenv()
+
 from flask import Flask
-from utils.database import db
+from utils.database import db, database_uri, wait_for_db
 from sqlalchemy import text
 
 # Adicionar o diretório raiz ao path do Python
@@ -9,19 +14,18 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 # Criar uma aplicação Flask mínima para executar as migrações
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = (
-    f"postgresql://{os.environ.get('POSTGRES_USER', 'postgres')}:"
-    f"{os.environ.get('POSTGRES_PASSWORD', 'postgres')}@"
-    f"{os.environ.get('POSTGRES_HOST', 'db')}:"
-    f"{os.environ.get('POSTGRES_PORT', '5432')}/"
-    f"{os.environ.get('POSTGRES_DB', 'masking_app')}"
-)
+app.config['SQLALCHEMY_DATABASE_URI'] = database_uri()
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 db.init_app(app)
 
 def run_migrations():
     with app.app_context():
+        # Criar as tabelas que ainda não existem a partir dos modelos; as
+        # existentes são atualizadas pelas alterações abaixo
+        import models
+        db.create_all()
+        
         # Verificar se as colunas já existem
         inspector = db.engine.dialect.inspector(db.engine)
         columns = [column['name'] for column in inspector.get_columns('users')]
@@ -72,8 +76,113 @@ def run_migrations():
             '''))
             print("Tabela 'system_config' criada com sucesso!")
         
+        # Adicionar coluna enabled_detectors se não existir
+        system_config_columns = [column['name'] for column in inspector.get_columns('system_config')]
+        if 'enabled_detectors' not in system_config_columns:
+            db.session.execute(text('ALTER TABLE system_config ADD COLUMN enabled_detectors TEXT'))
+            print("Coluna 'enabled_detectors' adicionada com sucesso!")
+        
+        # Mapeamentos das sessões em formato binário comprimido
+        session_columns = [column['name'] for column in inspector.get_columns('sessions')]
+        if 'mappings_data' not in session_columns:
+            db.session.execute(text('ALTER TABLE sessions ADD COLUMN mappings_data BYTEA'))
+            db.session.execute(text('ALTER TABLE sessions ALTER COLUMN mappings DROP NOT NULL'))
+            print("Coluna 'mappings_data' adicionada com sucesso!")
+        
+        # Validade das sessões: as existentes recebem a data do mascaramento
+        # registrado no histórico (ou a data atual) e o prazo de retenção
+        if 'expires_at' not in session_columns:
+            from models.session import SESSION_RETENTION_DAYS
+            db.session.execute(text('ALTER TABLE sessions ADD COLUMN created_at TIMESTAMP'))
+            db.session.execute(text('ALTER TABLE sessions ADD COLUMN expires_at TIMESTAMP'))
+            db.session.execute(text('''
+                UPDATE sessions SET created_at = COALESCE(
+                    (SELECT MIN(timestamp) FROM document_history
+                     WHERE document_history.session_id = sessions.session_id AND operation = 'mask'),
+                    NOW() AT TIME ZONE 'UTC'
+                )
+            '''))
+            db.session.execute(text('UPDATE sessions SET expires_at = created_at + make_interval(days => :days)'), {'days': SESSION_RETENTION_DAYS})
+            db.session.execute(text('ALTER TABLE sessions ALTER COLUMN created_at SET NOT NULL'))
+            db.session.execute(text('ALTER TABLE sessions ALTER COLUMN expires_at SET NOT NULL'))
+            print("Colunas 'created_at' e 'expires_at' adicionadas à tabela 'sessions' com sucesso!")
+        db.session.execute(text('CREATE INDEX IF NOT EXISTS ix_sessions_expires_at ON sessions (expires_at)'))
+        
+        if 'session_mapping_chunks' not in table_names:
+            db.session.execute(text('''
+                CREATE TABLE session_mapping_chunks (
+                    session_id UUID NOT NULL REFERENCES sessions (id) ON DELETE CASCADE,
+                    seq INTEGER NOT NULL,
+                    data BYTEA NOT NULL,
+                    PRIMARY KEY (session_id, seq)
+                )
+            '''))
+            print("Tabela 'session_mapping_chunks' criada com sucesso!")
+        
+        # Os mapeamentos já chegam comprimidos: evitar nova tentativa de compressão
+        # no TOAST. Aplicado sempre (é idempotente), pois create_all pode ter criado
+        # as colunas antes desta etapa.
+        db.session.execute(text('ALTER TABLE sessions ALTER COLUMN mappings_data SET STORAGE EXTERNAL'))
+        db.session.execute(text('ALTER TABLE session_mapping_chunks ALTER COLUMN data SET STORAGE EXTERNAL'))
+        db.session.commit()
+        
+        # Converter as sessões existentes do JSON para o formato binário, em lotes
+        from models import Session as SessionModel
+        converted = 0
+        while True:
+            sessions = SessionModel.query.filter(SessionModel.legacy_mappings.isnot(None)).limit(200).all()
+            if not sessions:
+                break
+            for db_session in sessions:
+                db_session.mappings = dict(db_session.legacy_mappings)
+            db.session.commit()
+            converted += len(sessions)
+        if converted:
+            print(f"Mapeamentos de {converted} sessões convertidos para o formato binário!")
+        
+        # Termos mascarados de jobs já encerrados não são mais guardados
+        if 'jobs' in table_names:
+            db.session.execute(text("UPDATE jobs SET mask_words = NULL WHERE status IN ('done', 'failed') AND mask_words IS NOT NULL"))
+            db.session.commit()
+        
+        # Índices compostos das listagens paginadas do painel administrativo
+        indexes = {
+            'ix_document_history_timestamp_id': 'document_history (timestamp, id)',
+            'ix_document_history_user_timestamp_id': 'document_history (user_id, timestamp, id)',
+            'ix_document_history_operation_timestamp_id': 'document_history (operation, timestamp, id)',
+            'ix_document_history_format_timestamp_id': 'document_history (file_format, timestamp, id)',
+            'ix_users_username_id': 'users (username, id)'
+        }
+        for index_name, definition in indexes.items():
+            db.session.execute(text(f'CREATE INDEX IF NOT EXISTS {index_name} ON {definition}'))
+        print("Índices das listagens paginadas verificados com sucesso!")
+        
+        # Criar tabela usage_stats se não existir
+        if 'usage_stats' not in table_names:
+            db.session.execute(text('''
+                CREATE TABLE usage_stats (
+                    day DATE NOT NULL,
+                    user_id UUID NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+                    file_format VARCHAR(10) NOT NULL,
+                    operation VARCHAR(10) NOT NULL,
+                    count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (day, user_id, file_format, operation)
+                )
+            '''))
+            print("Tabela 'usage_stats' criada com sucesso!")
+        
+        # Preencher as estatísticas a partir do histórico existente
+        stats_rows = db.session.execute(text('SELECT COUNT(*) FROM usage_stats')).scalar()
+        if not stats_rows:
+            from utils.usage_stats import rebuild_usage_stats
+            rows = rebuild_usage_stats()
+            print(f"Estatísticas de uso calculadas a partir do histórico: {rows} linhas.")
+        
         db.session.commit()
         print("Migrações concluídas com sucesso!")
 
 if __name__ == '__main__':
+    # Comando único de preparação do esquema, executado antes de iniciar a aplicação
+    if not wait_for_db(app):
+        sys.exit(1)
     run_migrations()
\ No newline at end of file
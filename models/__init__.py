@@ -1,7 +1,11 @@
 from .user import User
 from .session import Session
+from .session_mapping_chunk import SessionMappingChunk
 from .document_history import DocumentHistory
 from .email_config import EmailConfig
 from .system_config import SystemConfig
+from .job import Job
+from .email_outbox import EmailOutbox
+from .usage_stats import UsageStats
 
-__all__ = ['User', 'Session', 'DocumentHistory', 'EmailConfig', 'SystemConfig']
\ No newline at end of file
+__all__ = ['User', 'Session', 'SessionMappingChunk', 'DocumentHistory', 'EmailConfig', 'SystemConfig', 'Job', 'EmailOutbox', 'UsageStats']
\ No newline at end of file
@@ -5,6 +5,13 @@ from datetime import datetime
 
 class DocumentHistory(db.Model):
     __tablename__ = 'document_history'
+    __table_args__ = (
+        # Índices compostos para a listagem paginada (timestamp, id) e seus filtros
+        db.Index('ix_document_history_timestamp_id', 'timestamp', 'id'),
+        db.Index('ix_document_history_user_timestamp_id', 'user_id', 'timestamp', 'id'),
+        db.Index('ix_document_history_operation_timestamp_id', 'operation', 'timestamp', 'id'),
+        db.Index('ix_document_history_format_timestamp_id', 'file_format', 'timestamp', 'id'),
+    )
     
     id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id'), nullable=False)
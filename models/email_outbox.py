@@ -0,0 +1,25 @@
+from utils.database import db
+from sqlalchemy.dialects.postgresql import UUID
+import uuid
+from datetime import datetime
+
+class EmailOutbox(db.Model):
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    to_email = db.Column(db.String(255), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    html_body = db.Column(db.Text, nullable=True)
+    status = db.Column(db.String(10), nullable=False, default='pending')  # 'pending', 'sent' ou 'failed'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<EmailOutbox {self.to_email} {self.status}>'
@@ -0,0 +1,40 @@
+from utils.database import db
+from sqlalchemy.dialects.postgresql import UUID
+import uuid
+from datetime import datetime
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id'), nullable=False)
+    operation = db.Column(db.String(10), nullable=False)  # 'mask' ou 'unmask'
+    status = db.Column(db.String(10), nullable=False, default='queued', index=True)  # 'queued', 'running', 'done' ou 'failed'
+    filename = db.Column(db.String(255), nullable=False)
+    file_format = db.Column(db.String(10), nullable=False)
+    mask_words = db.Column(db.JSON, nullable=True)
+    pdf_mode = db.Column(db.String(10), nullable=True)
+    session_id = db.Column(db.String(100), nullable=True)
+    input_path = db.Column(db.String(500), nullable=True)
+    result_path = db.Column(db.String(500), nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            'job_id': str(self.id),
+            'operation': self.operation,
+            'status': self.status,
+            'filename': self.filename,
+            'file_format': self.file_format,
+            'session_id': self.session_id,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.status}>'
@@ -1,6 +1,23 @@
 from utils.database import db
 from sqlalchemy.dialects.postgresql import UUID
+from utils.mapping_codec import encode_mappings, decode_mappings, iter_encoded_mappings, iter_decoded_mappings, MAPPINGS_INLINE_MAX_SIZE, MAPPINGS_CHUNK_SIZE
+from utils.masking_engine import SessionMappings
+from .session_mapping_chunk import SessionMappingChunk
 import uuid
+import os
+from datetime import datetime, timedelta
+
+# Dias que uma sessão não restaurada é mantida antes de ser removida pela limpeza periódica
+SESSION_RETENTION_DAYS = int(os.environ.get('SESSION_RETENTION_DAYS', '30'))
+
+# Partes gravadas por comando INSERT ao persistir mapeamentos que estão em disco
+MAPPINGS_CHUNK_INSERT_BATCH = 8
+
+# Formato registrado na sessão única de um lote com mapeamento compartilhado
+SHARED_SESSION_FORMAT = 'zip'
+
+def session_expires_at():
+    return datetime.utcnow() + timedelta(days=SESSION_RETENTION_DAYS)
 
 class Session(db.Model):
     __tablename__ = 'sessions'
@@ -10,7 +27,103 @@ class Session(db.Model):
     user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id'), nullable=False)
     original_filename = db.Column(db.String(255), nullable=False)
     file_format = db.Column(db.String(10), nullable=False)
-    mappings = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # Índice usado pela remoção periódica das sessões expiradas
+    expires_at = db.Column(db.DateTime, default=session_expires_at, nullable=False, index=True)
+    # Mapeamentos token -> original comprimidos (utils/mapping_codec.py). Acima de
+    # MAPPINGS_INLINE_MAX_SIZE vão para session_mapping_chunks. As colunas são
+    # carregadas só quando os mapeamentos são usados, não em toda consulta da sessão.
+    mappings_data = db.deferred(db.Column(db.LargeBinary, nullable=True))
+    # Formato antigo (JSON), mantido apenas para sessões ainda não convertidas
+    legacy_mappings = db.deferred(db.Column('mappings', db.JSON(none_as_null=True), nullable=True))
+    chunks = db.relationship(SessionMappingChunk, order_by=SessionMappingChunk.seq, cascade='all, delete-orphan', passive_deletes=True)
+    
+    @classmethod
+    def find_active(cls, session_id):
+        # Sessões expiradas são tratadas como inexistentes mesmo antes de removidas
+        return cls.query.filter(cls.session_id == session_id, cls.expires_at > datetime.utcnow()).first()
+    
+    @property
+    def is_shared(self):
+        # Sessão de um lote inteiro: vale para vários documentos, com formatos diferentes
+        return self.file_format == SHARED_SESSION_FORMAT
+    
+    @property
+    def mappings(self):
+        mappings = getattr(self, '_mappings', None)
+        if mappings is None:
+            if self.mappings_data is not None:
+                mappings = decode_mappings(self.mappings_data)
+            elif self.chunks:
+                mappings = decode_mappings(b''.join(chunk.data for chunk in self.chunks))
+            else:
+                mappings = dict(self.legacy_mappings or {})
+            self._mappings = mappings
+        return mappings
+    
+    @mappings.setter
+    def mappings(self, mappings):
+        data = encode_mappings(mappings)
+        self.legacy_mappings = None
+        if len(data) > MAPPINGS_INLINE_MAX_SIZE:
+            self.mappings_data = None
+            self.chunks = [
+                SessionMappingChunk(seq=seq, data=data[start:start + MAPPINGS_CHUNK_SIZE])
+                for seq, start in enumerate(range(0, len(data), MAPPINGS_CHUNK_SIZE))
+            ]
+        else:
+            self.mappings_data = data
+            self.chunks = []
+        # Um SessionMappings pode ser liberado por quem o criou; nesse caso a
+        # próxima leitura decodifica os dados gravados
+        self._mappings = mappings if type(mappings) is dict else None
+    
+    def save_mappings(self, mappings):
+        # A sessão precisa já estar em db.session. Mapeamentos em memória usam o
+        # setter; os que passaram para o disco (SessionMappings.spilled) são
+        # comprimidos e gravados em lotes de partes, sem montar o conjunto inteiro
+        # em memória.
+        if not getattr(mappings, 'spilled', False):
+            self.mappings = mappings
+            return
+        
+        self.legacy_mappings = None
+        self.mappings_data = None
+        self._mappings = None
+        if self.id is None:
+            self.id = uuid.uuid4()
+        # A linha da sessão precisa existir antes das partes (chave estrangeira)
+        db.session.flush()
+        
+        table = SessionMappingChunk.__table__
+        db.session.execute(table.delete().where(table.c.session_id == self.id))
+        batch = []
+        for seq, data in enumerate(iter_encoded_mappings(mappings, MAPPINGS_CHUNK_SIZE)):
+            batch.append({'session_id': self.id, 'seq': seq, 'data': data})
+            if len(batch) >= MAPPINGS_CHUNK_INSERT_BATCH:
+                db.session.execute(table.insert(), batch)
+                batch = []
+        if batch:
+            db.session.execute(table.insert(), batch)
+        db.session.expire(self, ['chunks'])
+    
+    def load_mappings(self):
+        # Mapeamentos para a restauração, lidos parte a parte em um SessionMappings
+        # que passa para o disco se ultrapassar o limite de memória. Quem chama
+        # libera o resultado com close().
+        store = SessionMappings()
+        if getattr(self, '_mappings', None) is not None:
+            store.update(self._mappings)
+        elif self.mappings_data is not None:
+            for batch in iter_decoded_mappings([self.mappings_data]):
+                store.update(batch)
+        elif self.legacy_mappings is not None:
+            store.update(self.legacy_mappings)
+        else:
+            chunks = db.session.query(SessionMappingChunk.data).filter_by(session_id=self.id).order_by(SessionMappingChunk.seq).yield_per(MAPPINGS_CHUNK_INSERT_BATCH)
+            for batch in iter_decoded_mappings(chunk.data for chunk in chunks):
+                store.update(batch)
+        return store
     
     def __repr__(self):
         return f'<Session {self.session_id}>'
\ No newline at end of file
@@ -0,0 +1,13 @@
+from utils.database import db
+from sqlalchemy.dialects.postgresql import UUID
+
+class SessionMappingChunk(db.Model):
+    # Partes dos mapeamentos comprimidos de sessões grandes, na ordem de 'seq'
+    __tablename__ = 'session_mapping_chunks'
+
+    session_id = db.Column(UUID(as_uuid=True), db.ForeignKey('sessions.id', ondelete='CASCADE'), primary_key=True)
+    seq = db.Column(db.Integer, primary_key=True)
+    data = db.Column(db.LargeBinary, nullable=False)
+
+    def __repr__(self):
+        return f'<SessionMappingChunk {self.session_id} {self.seq}>'
@@ -7,6 +7,7 @@ class SystemConfig(db.Model):
     
     id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     allow_local_registration = db.Column(db.Boolean, default=True, nullable=False)
+    enabled_detectors = db.Column(db.Text, nullable=True)  # Lista separada por vírgulas; NULL = DEFAULT_DETECTORS
     
     def __repr__(self):
         return f'<SystemConfig allow_local_registration={self.allow_local_registration}>'
\ No newline at end of file
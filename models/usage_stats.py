@@ -0,0 +1,16 @@
+from utils.database import db
+from sqlalchemy.dialects.postgresql import UUID
+
+class UsageStats(db.Model):
+    # Contagem de operações por dia, usuário, formato e operação, mantida a cada
+    # inserção em document_history (ver utils/usage_stats.py)
+    __tablename__ = 'usage_stats'
+
+    day = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    file_format = db.Column(db.String(10), primary_key=True)
+    operation = db.Column(db.String(10), primary_key=True)  # 'mask' ou 'unmask'
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<UsageStats {self.day} {self.user_id} {self.file_format} {self.operation}={self.count}>'
@@ -4,6 +4,10 @@ import uuid
 
 class User(db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        # Índice para a listagem paginada por (username, id)
+        db.Index('ix_users_username_id', 'username', 'id'),
+    )
     
     id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     entra_id = db.Column(db.String(100), unique=True, nullable=True)
@@ -0,0 +1,29 @@
+import os
+import sys
+from dotenv import load_dotenv
+
+# Antes dos módulos da aplicação, que leem as configurações ao serem importados
+load_dotenv()
+
+from flask import Flask
+from utils.database import db, database_uri
+
+# Adicionar o diretório raiz ao path do Python
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Criar uma aplicação Flask mínima para recalcular as estatísticas
+app = Flask(__name__)
+app.config['SQLALCHEMY_DATABASE_URI'] = database_uri()
+app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+db.init_app(app)
+
+def run_rebuild():
+    from utils.usage_stats import rebuild_usage_stats
+    with app.app_context():
+        db.create_all()
+        rows = rebuild_usage_stats()
+        print(f"Estatísticas de uso recalculadas a partir do histórico: {rows} linhas.")
+
+if __name__ == '__main__':
+    run_rebuild()
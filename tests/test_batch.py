@@ -0,0 +1,25 @@
+import io
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from utils import batch
+from utils.batch import BatchTooLargeError, save_batch_inputs, shared_session_restored
+
+def uploads(count):
+    return [FileStorage(io.BytesIO(b'conteudo'), f'doc{index}.docx') for index in range(count)]
+
+def test_multi_file_upload_respects_the_entry_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, 'BATCH_MAX_ENTRIES', 2)
+    entries, manifest = save_batch_inputs(uploads(2), str(tmp_path))
+    assert [entry['name'] for entry in entries] == ['doc0.docx', 'doc1.docx']
+    assert manifest == {}
+
+    with pytest.raises(BatchTooLargeError):
+        save_batch_inputs(uploads(3), str(tmp_path))
+
+def test_shared_session_is_restored_only_with_the_whole_manifest():
+    manifest = {'masked_a.docx': 'lote', 'masked_b.pdf': 'lote', 'masked_c.xlsx': 'outra'}
+    assert shared_session_restored('lote', manifest, {'masked_a.docx', 'masked_b.pdf'})
+    assert not shared_session_restored('lote', manifest, {'masked_a.docx'})
+    # Sem manifesto não há como saber se o lote inteiro foi restaurado
+    assert not shared_session_restored('lote', None, {'masked_a.docx', 'masked_b.pdf'})
@@ -0,0 +1,33 @@
+import threading
+from utils.config_cache import ConfigCache
+
+def test_value_is_cached_until_invalidated():
+    values = iter([1, 2])
+    cache = ConfigCache('test', lambda: next(values), ttl=300)
+    assert cache.get() == 1
+    assert cache.get() == 1
+    cache.invalidate()
+    assert cache.get() == 2
+
+def test_invalidation_during_load_discards_the_loaded_value():
+    loading = threading.Event()
+    release = threading.Event()
+    rows = ['antigo', 'novo']
+
+    def loader():
+        value = rows[0]
+        loading.set()
+        release.wait(5)
+        return value
+
+    cache = ConfigCache('test', loader, ttl=300)
+    reader = threading.Thread(target=cache.get)
+    reader.start()
+    loading.wait(5)
+    # A alteração é gravada e avisada enquanto a leitura anterior está em andamento
+    rows.pop(0)
+    cache.invalidate()
+    release.set()
+    reader.join(5)
+
+    assert cache.get() == 'novo'
@@ -0,0 +1,40 @@
+import re
+from utils.detectors import DETECTORS, get_default_detectors, normalize_detectors
+from utils.file_processor import mask_text
+from utils.masking_engine import SessionMappings
+
+TEXT = 'Relatório 2023-2024, processo 1234-5678, nota 12345-678'
+
+def phone_matches(text):
+    return [match.group(0) for match in re.finditer(DETECTORS['PHONE'].pattern, text)]
+
+def test_unset_detectors_default_to_cpf_and_cnpj():
+    assert normalize_detectors(None) == ('CNPJ', 'CPF')
+    assert get_default_detectors() == ('CNPJ', 'CPF')
+
+def test_default_detectors_keep_ordinary_numbers():
+    mappings = SessionMappings()
+    assert mask_text(TEXT, [], mappings) == TEXT
+    assert len(mappings) == 0
+
+def test_default_detectors_mask_formatted_cpf_and_cnpj():
+    mappings = SessionMappings()
+    masked = mask_text('CPF 529.982.247-25, CNPJ 11.222.333/0001-81, tel (11) 98765-4321', [], mappings)
+    assert re.fullmatch(r'CPF \[CPF_\w+\], CNPJ \[CNPJ_\w+\], tel \(11\) 98765-4321', masked)
+
+def test_phone_ignores_numbers_without_area_code():
+    assert phone_matches(TEXT) == []
+    assert phone_matches('período 2023-2024') == []
+    assert phone_matches('protocolo 1234-5678') == []
+
+def test_phone_matches_numbers_with_area_code_or_mobile_prefix():
+    assert phone_matches('(11) 3456-7890') == ['(11) 3456-7890']
+    assert phone_matches('ligue 11 98765-4321') == ['11 98765-4321']
+    assert phone_matches('+55 (21) 91234-5678') == ['+55 (21) 91234-5678']
+    assert phone_matches('celular 98765-4321') == ['98765-4321']
+
+def test_opt_in_detectors_only_run_when_enabled():
+    mappings = SessionMappings()
+    masked = mask_text(TEXT + ', tel (11) 3456-7890', [], mappings, detectors=['PHONE'])
+    assert masked.startswith(TEXT + ', tel [PHONE_')
+    assert '[CEP_' in mask_text('nota 12345-678', [], SessionMappings(), detectors=['CEP'])
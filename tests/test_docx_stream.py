@@ -0,0 +1,97 @@
+import io
+import re
+import zipfile
+from utils.docx_stream import distribute_replacements, rewrite_docx
+from utils.masking_engine import SessionMappings, get_masking_engine, restore_replacements
+
+CPF = '529.982.247-25'
+NAMESPACE = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+
+def paragraph(*runs):
+    # Um parágrafo com um run por texto, cada um com sua formatação
+    return '<w:p>' + ''.join(
+        f'<w:r><w:rPr><w:b w:val="{index}"/></w:rPr><w:t xml:space="preserve">{text}</w:t></w:r>'
+        for index, text in enumerate(runs)
+    ) + '</w:p>'
+
+def part(root, *paragraphs):
+    return f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><w:{root} {NAMESPACE}>{"".join(paragraphs)}</w:{root}>'
+
+def build_docx(parts):
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as package:
+        for name, content in parts.items():
+            package.writestr(name, content)
+    output.seek(0)
+    return output
+
+def read_parts(docx):
+    with zipfile.ZipFile(docx) as package:
+        return {name: package.read(name) for name in package.namelist()}
+
+def texts(xml):
+    return re.findall(r'<w:t[^>]*>([^<]*)</w:t>', xml)
+
+def test_replacement_spanning_runs_stays_in_the_first_run():
+    runs = ['CPF 529.', '982.247', '-25 fim']
+    text = ''.join(runs)
+    start = text.index(CPF)
+    assert distribute_replacements(runs, [(start, start + len(CPF), '[CPF_1]')]) == ['CPF [CPF_1]', '', ' fim']
+
+def test_several_replacements_across_runs():
+    runs = ['Ana e Jo', 'ão', ' e Ana']
+    replacements = [(0, 3, '[A]'), (6, 10, '[J]'), (13, 16, '[A]')]
+    assert distribute_replacements(runs, replacements) == ['[A] e [J]', '', ' e [A]']
+    assert distribute_replacements(['sem', ' nada'], []) == ['sem', ' nada']
+
+def test_text_split_across_runs_is_masked_keeping_formatting():
+    document = part('document', '<w:body>', paragraph('Maria ', 'CPF 529.98', '2.247-25', ' &amp; cia'), '</w:body>')
+    mappings = SessionMappings()
+    engine = get_masking_engine(['maria'])
+    masked = rewrite_docx(build_docx({'word/document.xml': document}),
+                          lambda text: engine.replacements(text, mappings))
+    xml = read_parts(masked)['word/document.xml'].decode('utf-8')
+
+    first, second, third, fourth = texts(xml)
+    assert re.fullmatch(r'\[MASKED_\w+\] ', first)
+    assert re.fullmatch(r'CPF \[CPF_\w+\]', second)
+    assert third == ''
+    assert fourth == ' &amp; cia'
+    # Os quatro runs e suas propriedades continuam no documento
+    assert xml.count('<w:rPr>') == 4
+
+def test_headers_footers_and_footnotes_round_trip():
+    parts = {
+        '[Content_Types].xml': '<?xml version="1.0"?><Types/>',
+        'word/document.xml': part('document', '<w:body>', paragraph('Contrato de ', 'Maria Silva'), '</w:body>'),
+        'word/header1.xml': part('hdr', paragraph('Cliente: Maria ', 'Silva')),
+        'word/footer1.xml': part('ftr', paragraph('CPF ', CPF)),
+        'word/footnotes.xml': part('footnotes', '<w:footnote w:id="1">', paragraph('Ver Maria Silva, ', CPF[:6], CPF[6:]), '</w:footnote>'),
+        'word/media/image1.png': b'\x89PNG\r\n\x1a\nMaria Silva',
+        'word/styles.xml': part('styles'),
+    }
+    original = build_docx(parts)
+    mappings = SessionMappings()
+    engine = get_masking_engine(['maria silva'])
+
+    masked = rewrite_docx(original, lambda text: engine.replacements(text, mappings))
+    masked_parts = read_parts(masked)
+    for name in ('word/document.xml', 'word/header1.xml', 'word/footer1.xml', 'word/footnotes.xml'):
+        xml = masked_parts[name].decode('utf-8')
+        assert 'Maria' not in xml and CPF not in xml, name
+    # Partes que não são de texto são copiadas sem alteração
+    assert masked_parts['word/media/image1.png'] == parts['word/media/image1.png']
+    assert len(mappings) == 2
+
+    masked.seek(0)
+    restored = rewrite_docx(masked, lambda text: restore_replacements(text, mappings))
+    restored_parts = read_parts(restored)
+    for name, content in parts.items():
+        if name.endswith('.xml') and name.startswith('word/') and name != 'word/styles.xml':
+            # O valor restaurado fica no run onde o trecho começava; o texto de cada parte é o original
+            assert ''.join(texts(restored_parts[name].decode('utf-8'))) == ''.join(texts(content)), name
+        else:
+            expected = content.encode('utf-8') if isinstance(content, str) else content
+            assert restored_parts[name] == expected, name
+    # Runs que não foram divididos por um trecho mascarado voltam idênticos
+    assert restored_parts['word/footer1.xml'] == parts['word/footer1.xml'].encode('utf-8')
@@ -0,0 +1,188 @@
+import socket
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult
+from flask import Flask
+
+from models import EmailConfig, EmailOutbox, User
+from utils.config_cache import invalidate_config
+from utils.database import db
+from utils.email_sender import SMTPConnection, queue_email, send_password_reset_email
+from utils.outbox import OUTBOX_MAX_ATTEMPTS, retry_delay, send_pending_emails
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+class RecordingHandler:
+    # Guarda as mensagens recebidas e conta as conexões (um EHLO por conexão)
+    def __init__(self):
+        self.messages = []
+        self.connections = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.connections += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        return '250 OK'
+
+@pytest.fixture
+def smtp_server():
+    handler = RecordingHandler()
+    controller = Controller(
+        handler, hostname='127.0.0.1', port=free_port(),
+        auth_require_tls=False, authenticator=lambda *args: AuthResult(success=True)
+    )
+    controller.start()
+    yield controller, handler
+    controller.stop()
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.metadata.create_all(db.engine, tables=[EmailConfig.__table__, EmailOutbox.__table__])
+        yield app
+        db.session.remove()
+    invalidate_config()
+
+def configure_smtp(port):
+    db.session.query(EmailConfig).delete()
+    db.session.add(EmailConfig(
+        smtp_server='127.0.0.1', smtp_port=port, smtp_username='app', smtp_password='secret',
+        use_tls=False, from_email='noreply@example.com'
+    ))
+    db.session.commit()
+    invalidate_config()
+
+def test_queued_emails_are_sent_by_the_outbox(app, smtp_server):
+    controller, handler = smtp_server
+    configure_smtp(controller.port)
+
+    queue_email('maria@example.com', 'Documento mascarado', 'corpo')
+    queue_email('joao@example.com', 'Documento restaurado', 'corpo', '<p>corpo</p>')
+    assert EmailOutbox.query.filter_by(status='pending').count() == 2
+    assert handler.messages == []
+
+    connection = SMTPConnection()
+    try:
+        assert send_pending_emails(connection) == 2
+    finally:
+        connection.close()
+
+    assert sorted(envelope.rcpt_tos[0] for envelope in handler.messages) == ['joao@example.com', 'maria@example.com']
+    assert all(email.status == 'sent' and email.sent_at for email in EmailOutbox.query.all())
+
+def test_connection_is_reused_between_sends(app, smtp_server):
+    controller, handler = smtp_server
+    configure_smtp(controller.port)
+    for index in range(5):
+        queue_email(f'user{index}@example.com', 'Assunto', 'corpo')
+
+    connection = SMTPConnection()
+    try:
+        send_pending_emails(connection)
+        queue_email('outro@example.com', 'Assunto', 'corpo')
+        send_pending_emails(connection)
+    finally:
+        connection.close()
+
+    assert len(handler.messages) == 6
+    assert handler.connections == 1
+
+def test_reconnects_after_idle_timeout(app, smtp_server):
+    controller, handler = smtp_server
+    configure_smtp(controller.port)
+    queue_email('a@example.com', 'Assunto', 'corpo')
+
+    connection = SMTPConnection(idle_timeout=0)
+    try:
+        send_pending_emails(connection)
+        time.sleep(0.01)
+        queue_email('b@example.com', 'Assunto', 'corpo')
+        send_pending_emails(connection)
+    finally:
+        connection.close()
+
+    assert len(handler.messages) == 2
+    assert handler.connections == 2
+
+def test_failed_sends_are_retried_with_backoff(app, smtp_server):
+    controller, handler = smtp_server
+    # Nenhum servidor nesta porta: a conexão é recusada
+    configure_smtp(free_port())
+    queue_email('maria@example.com', 'Assunto', 'corpo')
+
+    connection = SMTPConnection()
+    before = datetime.utcnow()
+    assert send_pending_emails(connection) == 1
+    email = EmailOutbox.query.one()
+    assert email.status == 'pending'
+    assert email.attempts == 1
+    assert email.last_error
+    assert email.next_attempt_at >= before + retry_delay(1)
+
+    # Antes do prazo da nova tentativa, o e-mail não é enviado de novo
+    assert send_pending_emails(connection) == 0
+    assert retry_delay(2) == 2 * retry_delay(1)
+
+    # Servidor disponível e prazo vencido: a nova tentativa é bem-sucedida
+    configure_smtp(controller.port)
+    email.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    try:
+        assert send_pending_emails(connection) == 1
+    finally:
+        connection.close()
+    assert EmailOutbox.query.one().status == 'sent'
+    assert len(handler.messages) == 1
+
+def test_email_fails_after_max_attempts(app):
+    configure_smtp(free_port())
+    queue_email('maria@example.com', 'Assunto', 'corpo')
+
+    connection = SMTPConnection()
+    for _ in range(OUTBOX_MAX_ATTEMPTS):
+        email = EmailOutbox.query.one()
+        email.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+        send_pending_emails(connection)
+
+    email = EmailOutbox.query.one()
+    assert email.status == 'failed'
+    assert email.attempts == OUTBOX_MAX_ATTEMPTS
+
+def test_password_reset_is_not_queued_without_email_config(app):
+    user = User(username='maria', email='maria@example.com')
+    success, message = send_password_reset_email(user, 'token')
+    assert not success
+    assert message == 'Configuração de e-mail não encontrada'
+    assert EmailOutbox.query.count() == 0
+
+    configure_smtp(free_port())
+    assert send_password_reset_email(user, 'token')[0]
+    assert EmailOutbox.query.one().to_email == 'maria@example.com'
+
+def test_stalled_server_times_out():
+    # Aceita a conexão TCP mas nunca envia a saudação SMTP
+    with socket.socket() as listener:
+        listener.bind(('127.0.0.1', 0))
+        listener.listen()
+        config = {
+            'smtp_server': '127.0.0.1', 'smtp_port': listener.getsockname()[1], 'smtp_username': 'app',
+            'smtp_password': 'secret', 'use_tls': False, 'from_email': 'noreply@example.com'
+        }
+        connection = SMTPConnection(timeout=0.5)
+        start = time.monotonic()
+        with pytest.raises(OSError):
+            connection.send(config, None)
+        assert time.monotonic() - start < 5
@@ -0,0 +1,86 @@
+import io
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+
+import utils.documents
+from models import Job, Session as SessionModel
+from utils import jobs
+from utils.database import db
+from utils.jobs import reap_stale_jobs, requeue_local_jobs, run_job
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.metadata.create_all(db.engine, tables=[Job.__table__, SessionModel.__table__])
+        yield app
+        db.session.remove()
+
+@pytest.fixture
+def unmask_ok(monkeypatch):
+    # Restauração instantânea: o teste trata só da transição de estado do job
+    monkeypatch.setattr(SessionModel, 'find_active', classmethod(lambda cls, session_id: object()))
+    monkeypatch.setattr(utils.documents, 'unmask_document', lambda *args: io.BytesIO(b'restaurado'))
+
+def add_job(tmp_path, status, started_minutes_ago=None, **fields):
+    job_id = uuid.uuid4()
+    input_path = tmp_path / f'{job_id}_input.docx'
+    input_path.write_bytes(b'entrada')
+    job = Job(
+        id=job_id, user_id=uuid.uuid4(), operation='unmask', status=status, filename='a.docx',
+        file_format='docx', session_id='sessao', input_path=str(input_path),
+        result_path=str(tmp_path / f'{job_id}_result.docx'), mask_words=['maria'], **fields
+    )
+    if started_minutes_ago is not None:
+        job.started_at = datetime.utcnow() - timedelta(minutes=started_minutes_ago)
+    db.session.add(job)
+    db.session.commit()
+    return job_id
+
+def test_finished_job_is_marked_done(app, tmp_path, unmask_ok):
+    job_id = add_job(tmp_path, 'running', started_minutes_ago=1)
+    run_job(job_id)
+
+    job = db.session.get(Job, job_id)
+    assert job.status == 'done'
+    assert job.finished_at and job.mask_words is None
+    assert open(job.result_path, 'rb').read() == b'restaurado'
+    assert not (tmp_path / f'{job_id}_input.docx').exists()
+
+def test_reaped_job_is_not_overwritten_when_the_worker_finishes(app, tmp_path, unmask_ok):
+    job_id = add_job(tmp_path, 'running', started_minutes_ago=120)
+    assert reap_stale_jobs(app, timeout_minutes=60) == 1
+
+    run_job(job_id)
+
+    db.session.expire_all()
+    job = db.session.get(Job, job_id)
+    assert job.status == 'failed'
+    assert job.error == 'Processamento interrompido; envie o arquivo novamente'
+    # O resultado gravado depois do prazo é descartado
+    assert not (tmp_path / f'{job_id}_result.docx').exists()
+
+def test_reaped_job_keeps_its_error_when_the_worker_fails(app, tmp_path):
+    job_id = add_job(tmp_path, 'running', started_minutes_ago=120)
+    reap_stale_jobs(app, timeout_minutes=60)
+
+    # Sessão inexistente: o job falharia com outra mensagem
+    run_job(job_id)
+
+    db.session.expire_all()
+    assert db.session.get(Job, job_id).error == 'Processamento interrompido; envie o arquivo novamente'
+
+def test_queued_jobs_return_to_the_local_queue_on_startup(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, '_local_queue', jobs.queue.Queue())
+    first = add_job(tmp_path, 'queued', created_at=datetime.utcnow() - timedelta(minutes=2))
+    second = add_job(tmp_path, 'queued', created_at=datetime.utcnow() - timedelta(minutes=1))
+    add_job(tmp_path, 'done')
+
+    assert requeue_local_jobs(app) == 2
+    assert [jobs._local_queue.get_nowait(), jobs._local_queue.get_nowait()] == [first, second]
+    assert jobs._local_queue.empty()
@@ -0,0 +1,123 @@
+import hashlib
+import uuid
+import zlib
+
+import pytest
+from flask import Flask
+
+import models.session
+from models import Session as SessionModel, SessionMappingChunk
+from utils.database import db
+from utils.mapping_codec import decode_mappings, encode_mappings, iter_decoded_mappings, iter_encoded_mappings
+from utils.masking_engine import SessionMappings
+
+MAPPINGS = {
+    '[CPF_1a2b]': '529.982.247-25',
+    '[MASKED_3c4d]': 'João da Conceição',
+    '[MASKED_5e6f]': '',
+    '[MASKED_7a8b]': '北京 😀 ação',
+}
+
+def many_mappings(count):
+    # Valores pouco comprimíveis, para gerar várias partes comprimidas
+    return {f'[MASKED_{index:x}]': hashlib.sha256(str(index).encode()).hexdigest() for index in range(count)}
+
+def decode_parts(parts):
+    return dict(item for batch in iter_decoded_mappings(parts) for item in batch)
+
+def test_round_trip_keeps_non_ascii_and_empty_values():
+    assert decode_mappings(encode_mappings(MAPPINGS)) == MAPPINGS
+    assert decode_mappings(encode_mappings({})) == {}
+
+def test_round_trip_with_nul_in_values():
+    mappings = dict(MAPPINGS, **{'[MASKED_9c0d]': 'antes\0depois'})
+    assert decode_mappings(encode_mappings(mappings)) == mappings
+    assert decode_parts([encode_mappings(mappings)]) == mappings
+
+def test_chunked_encoding_matches_the_single_blob():
+    mappings = many_mappings(500)
+    parts = list(iter_encoded_mappings(mappings, chunk_size=512, batch_size=64))
+    assert len(parts) > 1
+    assert zlib.decompress(b''.join(parts)) == zlib.decompress(encode_mappings(mappings))
+    assert decode_parts(parts) == mappings
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        decode_mappings(zlib.compress(b'XXXX' + bytes(5)))
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.metadata.create_all(db.engine, tables=[SessionModel.__table__, SessionMappingChunk.__table__])
+        yield app
+        db.session.remove()
+
+def new_session(**fields):
+    db_session = SessionModel(session_id=str(uuid.uuid4()), user_id=uuid.uuid4(), original_filename='a.docx', file_format='docx', **fields)
+    db.session.add(db_session)
+    return db_session
+
+def reload(db_session):
+    # Lida de novo do banco, sem os mapeamentos guardados na instância
+    session_id = db_session.session_id
+    db.session.commit()
+    db.session.expunge_all()
+    return SessionModel.find_active(session_id)
+
+def load(db_session):
+    store = db_session.load_mappings()
+    try:
+        return dict(store.items())
+    finally:
+        store.close()
+
+def test_small_mappings_are_stored_inline(app):
+    db_session = new_session()
+    db_session.save_mappings(SessionMappings(MAPPINGS))
+    db_session = reload(db_session)
+    assert db_session.mappings_data is not None
+    assert db_session.chunks == []
+    assert load(db_session) == MAPPINGS
+    assert db_session.mappings == MAPPINGS
+
+def test_legacy_json_mappings_are_still_read(app):
+    db_session = reload(new_session(legacy_mappings=MAPPINGS))
+    assert db_session.mappings_data is None
+    assert load(db_session) == MAPPINGS
+    assert db_session.mappings == MAPPINGS
+
+def test_spilled_mappings_are_saved_in_chunks(app, monkeypatch):
+    monkeypatch.setattr(models.session, 'MAPPINGS_CHUNK_SIZE', 256)
+    mappings = many_mappings(400)
+    # Orçamento zero: os mapeamentos vão para o disco desde a primeira entrada
+    store = SessionMappings(mappings, memory_budget=0)
+    assert store.spilled
+
+    db_session = new_session()
+    try:
+        db_session.save_mappings(store)
+    finally:
+        store.close()
+    db_session = reload(db_session)
+
+    assert db_session.mappings_data is None
+    # Mais partes que um INSERT grava de uma vez
+    assert len(db_session.chunks) > models.session.MAPPINGS_CHUNK_INSERT_BATCH
+    assert [chunk.seq for chunk in db_session.chunks] == list(range(len(db_session.chunks)))
+    assert load(db_session) == mappings
+    assert db_session.mappings == mappings
+
+def test_large_in_memory_mappings_go_to_chunks(app, monkeypatch):
+    monkeypatch.setattr(models.session, 'MAPPINGS_INLINE_MAX_SIZE', 1024)
+    monkeypatch.setattr(models.session, 'MAPPINGS_CHUNK_SIZE', 1024)
+    mappings = many_mappings(200)
+    db_session = new_session()
+    db_session.mappings = mappings
+    db_session = reload(db_session)
+
+    assert db_session.mappings_data is None
+    assert len(db_session.chunks) > 1
+    assert load(db_session) == mappings
@@ -0,0 +1,74 @@
+import os
+import pickle
+
+from utils.mapping_store import ENTRY_OVERHEAD, MappingStore, SQLiteMappingBackend
+
+def entries(count):
+    return [(f'[MASKED_{index:04x}]', f'valor {index} ação') for index in range(count)]
+
+def test_store_stays_in_memory_within_the_budget():
+    store = MappingStore(entries(10), memory_budget=10 * (40 + ENTRY_OVERHEAD))
+    assert not store.spilled
+    assert len(store) == 10
+    store.close()
+
+def test_spill_past_the_budget_keeps_lookups_correct(tmp_path, monkeypatch):
+    monkeypatch.setattr('utils.mapping_store.MAPPINGS_SPILL_DIR', str(tmp_path))
+    items = entries(100)
+    store = MappingStore(memory_budget=20 * ENTRY_OVERHEAD)
+    for token, value in items:
+        store[token] = value
+
+    assert store.spilled
+    assert len(os.listdir(tmp_path)) == 1
+    assert len(store) == 100
+    for token, value in items:
+        assert store[token] == value
+        assert token in store
+    assert store.get('[MASKED_ffff]') is None
+    assert '[MASKED_ffff]' not in store
+    assert sorted(store.items()) == items
+
+    # Regravar um token já em disco substitui o valor
+    store[items[0][0]] = 'novo'
+    assert store[items[0][0]] == 'novo'
+    assert len(store) == 100
+    store.close()
+
+def test_close_removes_the_spill_file(tmp_path, monkeypatch):
+    monkeypatch.setattr('utils.mapping_store.MAPPINGS_SPILL_DIR', str(tmp_path))
+    store = MappingStore(entries(50), memory_budget=0)
+    path = store.data.path
+    assert os.path.exists(path)
+
+    store.close()
+    assert not os.path.exists(path)
+    assert not store.spilled
+    assert len(store) == 0
+    # Fechar de novo não falha
+    store.close()
+
+def test_spilled_store_is_sent_by_path(tmp_path, monkeypatch):
+    # Como nos processos do pool: só o caminho do arquivo é serializado
+    monkeypatch.setattr('utils.mapping_store.MAPPINGS_SPILL_DIR', str(tmp_path))
+    store = MappingStore(entries(30), memory_budget=0)
+    path = store.data.path
+    payload = pickle.dumps(store)
+    assert len(payload) < 1024
+
+    copy = pickle.loads(payload)
+    assert copy.spilled
+    assert dict(copy.items()) == dict(entries(30))
+    copy.data.connection.close()
+    store.close()
+    assert not os.path.exists(path)
+
+def test_backend_without_ownership_keeps_the_file(tmp_path):
+    owner = SQLiteMappingBackend(str(tmp_path / 'mappings.sqlite'))
+    owner.update(entries(3))
+    owner.connection.close()
+
+    reader = SQLiteMappingBackend(owner.path, owner=False)
+    assert reader.get('[MASKED_0001]') == 'valor 1 ação'
+    reader.close()
+    assert os.path.exists(owner.path)
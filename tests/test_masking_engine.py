@@ -0,0 +1,79 @@
+import re
+from utils.file_processor import mask_text, restore_text
+from utils.masking_engine import (
+    TOKEN_PATTERN, SessionMappings, build_words_regex, get_masking_engine, restore_replacements
+)
+
+CPF = '529.982.247-25'
+
+def masked_values(text, mask_words, detectors=None):
+    # Valores originais na ordem em que foram substituídos no texto
+    mappings = SessionMappings()
+    masked = mask_text(text, mask_words, mappings, detectors)
+    return [mappings[token] for token in TOKEN_PATTERN.findall(masked)]
+
+def test_longest_word_wins_for_prefixes_and_overlaps():
+    words = ['ana', 'ana maria', 'mar', 'maria']
+    assert masked_values('ana maria e maria e ana', words) == ['ana maria', 'maria', 'ana']
+    assert masked_values('marte', ['mar', 'marte']) == ['marte']
+    assert re.fullmatch(build_words_regex(words), 'ana maria')
+
+def test_words_match_ignoring_case():
+    assert masked_values('Cliente JOÃO SILVA e João Silva', ['joão silva']) == ['JOÃO SILVA', 'João Silva']
+
+def test_regex_metacharacters_in_words_are_literal():
+    words = ['a.b', 'c++', '(x)', '[y]', 'r$ 10']
+    text = 'a.b axb c++ (x) x [y] y r$ 10'
+    assert masked_values(text, words) == ['a.b', 'c++', '(x)', '[y]', 'r$ 10']
+
+def test_words_and_detectors_in_one_pass():
+    mappings = SessionMappings()
+    masked = mask_text(f'Maria, CPF {CPF}, CNPJ 11.222.333/0001-81', ['maria'], mappings)
+    assert re.fullmatch(r'\[MASKED_\w+\], CPF \[CPF_\w+\], CNPJ \[CNPJ_\w+\]', masked)
+    assert sorted(value for _, value in mappings.items()) == ['11.222.333/0001-81', CPF, 'Maria']
+
+def test_engine_is_reused_for_the_same_words():
+    assert get_masking_engine(['Maria', 'joão']) is get_masking_engine(['João', 'maria', ''])
+
+def test_mask_and_restore_round_trip():
+    text = f'Maria (CPF {CPF}) assinou com [MASKED_notoken] e Maria.'
+    mappings = SessionMappings()
+    masked = mask_text(text, ['maria'], mappings)
+    assert 'Maria' not in masked and CPF not in masked
+    assert restore_text(masked, mappings) == text
+
+def test_restore_replacements_point_at_known_tokens():
+    mappings = SessionMappings()
+    masked = mask_text(f'CPF {CPF} e [CPF_desconhecido]', [], mappings)
+    replacements = restore_replacements(masked, mappings)
+    assert [original for _, _, original in replacements] == [CPF]
+    start, end, _ = replacements[0]
+    assert TOKEN_PATTERN.fullmatch(masked[start:end])
+
+def test_identical_values_share_a_token_within_a_session():
+    mappings = SessionMappings()
+    masked = mask_text(f'{CPF} {CPF} Maria maria', ['maria'], mappings)
+    tokens = masked.split()
+    assert tokens[0] == tokens[1]
+    # A capitalização faz parte do valor original, então cada forma tem seu token
+    assert tokens[2] != tokens[3]
+    assert len(mappings) == 3
+
+def test_identical_values_get_different_tokens_across_sessions():
+    first = mask_text(CPF, [], SessionMappings())
+    second = mask_text(CPF, [], SessionMappings())
+    assert first != second
+
+def test_unique_mode_issues_a_token_per_occurrence():
+    mappings = SessionMappings(token_mode='unique')
+    first, second = mask_text(f'{CPF} {CPF}', [], mappings).split()
+    assert first != second
+    assert len(mappings) == 2
+
+def test_merge_reuses_tokens_from_the_same_key():
+    main = SessionMappings()
+    worker = SessionMappings(key=main.key)
+    token = worker.tokenize('CPF', CPF)
+    main.merge(dict(worker.items()))
+    assert main.tokenize('CPF', CPF) == token
+    assert len(main) == 1
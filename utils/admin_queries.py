@@ -0,0 +1,127 @@
+import json
+import uuid
+import base64
+from datetime import datetime, timedelta
+from utils.database import db
+from models import User, DocumentHistory
+
+# Tamanho padrão e máximo das páginas das listagens do painel administrativo
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, UnicodeError):
+        raise ValueError("Cursor inválido")
+
+def page_size(args):
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("Parâmetro 'limit' inválido")
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+def parse_date(value, end=False):
+    # Aceita data (AAAA-MM-DD) ou data e hora ISO; 'date_to' só com a data inclui o dia inteiro
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Data inválida: {value}")
+    if end and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+def parse_bool(value):
+    return value.lower() in ('1', 'true', 'on')
+
+def history_page(args):
+    # Paginação por chave (timestamp, id) em ordem decrescente: cada página custa o
+    # mesmo, independente da posição, usando os índices compostos da tabela
+    limit = page_size(args)
+    query = db.session.query(
+        DocumentHistory.id,
+        DocumentHistory.user_id,
+        User.username,
+        DocumentHistory.filename,
+        DocumentHistory.file_format,
+        DocumentHistory.operation,
+        DocumentHistory.session_id,
+        DocumentHistory.timestamp
+    ).join(User, User.id == DocumentHistory.user_id)
+
+    if args.get('user_id'):
+        try:
+            query = query.filter(DocumentHistory.user_id == uuid.UUID(args['user_id']))
+        except ValueError:
+            raise ValueError("Parâmetro 'user_id' inválido")
+    if args.get('operation'):
+        query = query.filter(DocumentHistory.operation == args['operation'])
+    if args.get('format'):
+        query = query.filter(DocumentHistory.file_format == args['format'].lower())
+    if args.get('date_from'):
+        query = query.filter(DocumentHistory.timestamp >= parse_date(args['date_from']))
+    if args.get('date_to'):
+        query = query.filter(DocumentHistory.timestamp < parse_date(args['date_to'], end=True))
+
+    if args.get('cursor'):
+        timestamp, record_id = decode_cursor(args['cursor'])
+        query = query.filter(db.tuple_(DocumentHistory.timestamp, DocumentHistory.id) < (datetime.fromisoformat(timestamp), uuid.UUID(record_id)))
+
+    rows = query.order_by(DocumentHistory.timestamp.desc(), DocumentHistory.id.desc()).limit(limit + 1).all()
+
+    items = [{
+        'id': str(row.id),
+        'user_id': str(row.user_id),
+        'username': row.username,
+        'filename': row.filename,
+        'file_format': row.file_format,
+        'operation': row.operation,
+        'session_id': row.session_id,
+        'timestamp': row.timestamp.isoformat() if row.timestamp else None
+    } for row in rows[:limit]]
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor([last.timestamp.isoformat(), str(last.id)])
+
+    return {'items': items, 'next_cursor': next_cursor}
+
+def users_page(args):
+    # Paginação por chave (username, id) em ordem crescente
+    limit = page_size(args)
+    query = User.query
+
+    if args.get('q'):
+        pattern = args['q'].replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        query = query.filter(db.or_(User.username.ilike(pattern), User.email.ilike(pattern)))
+    for flag in ('is_admin', 'is_local', 'is_approved'):
+        if args.get(flag):
+            query = query.filter(getattr(User, flag) == parse_bool(args[flag]))
+
+    if args.get('cursor'):
+        username, user_id = decode_cursor(args['cursor'])
+        query = query.filter(db.tuple_(User.username, User.id) > (username, uuid.UUID(user_id)))
+
+    users = query.order_by(User.username, User.id).limit(limit + 1).all()
+
+    items = [{
+        'id': str(user.id),
+        'username': user.username,
+        'email': user.email,
+        'is_admin': user.is_admin,
+        'is_local': user.is_local,
+        'is_approved': user.is_approved,
+        'mfa_enabled': user.mfa_enabled
+    } for user in users[:limit]]
+
+    next_cursor = None
+    if len(users) > limit:
+        last = users[limit - 1]
+        next_cursor = encode_cursor([last.username, str(last.id)])
+
+    return {'items': items, 'next_cursor': next_cursor}
@@ -0,0 +1,284 @@
+import os
+import json
+import uuid
+import shutil
+import zipfile
+import threading
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.utils import secure_filename
+from utils.database import db
+from models import User, DocumentHistory, Session as SessionModel
+from models.session import SHARED_SESSION_FORMAT
+from utils.file_processor import allowed_file, process_document, new_output_file, preload_document_libraries, add_cell_cache_stats, get_cell_cache_stats, default_pool_size
+from utils.masking_engine import SessionMappings
+from utils.system_config import get_enabled_detectors
+
+# Processos dedicados ao processamento de lotes, em cada worker da aplicação
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS') or default_pool_size())
+
+# Limites de um lote. Em um .zip enviado são verificados pelo diretório do
+# arquivo antes de extrair qualquer entrada (proteção contra zip bombs).
+BATCH_MAX_ENTRIES = int(os.environ.get('BATCH_MAX_ENTRIES', '200'))
+BATCH_MAX_UNCOMPRESSED_SIZE = int(os.environ.get('BATCH_MAX_UNCOMPRESSED_MB', '500')) * 1024 * 1024
+
+# Manifesto incluído no zip de saída: nome do arquivo mascarado -> ID da sessão
+MANIFEST_NAME = 'sessions.json'
+
+_batch_pool = None
+_batch_pool_lock = threading.Lock()
+
+class BatchTooLargeError(ValueError):
+    pass
+
+def get_batch_pool():
+    global _batch_pool
+    # Vários lotes podem chegar ao mesmo tempo pelas threads do worker
+    with _batch_pool_lock:
+        if _batch_pool is None:
+            # Processos dedicados a documentos: as bibliotecas de todos os formatos
+            # são carregadas ao iniciar, e não no primeiro arquivo de cada formato
+            _batch_pool = ProcessPoolExecutor(max_workers=BATCH_WORKERS, mp_context=multiprocessing.get_context('spawn'),
+                                              initializer=preload_document_libraries, initargs=('all',))
+        return _batch_pool
+
+def discard_batch_pool(pool):
+    # Um processo do pool morreu e o executor ficou inutilizável: o próximo
+    # lote cria um pool novo
+    global _batch_pool
+    with _batch_pool_lock:
+        if _batch_pool is pool:
+            _batch_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def process_batch_entry(input_path, output_path, file_format, mask_words, detectors, pdf_mode, is_masking, token_mode, key, mappings):
+    # Executado nos processos do pool. O lote já ocupa todos os processos, então
+    # o paralelismo por páginas de PDF fica desativado aqui para não aninhar pools.
+    import utils.file_processor
+    utils.file_processor.PDF_WORKERS = 1
+    cache_before = get_cell_cache_stats()
+
+    if is_masking:
+        session_data = SessionMappings(token_mode=token_mode, key=key)
+    else:
+        session_data = mappings
+
+    result = process_document(input_path, file_format, mask_words, session_data, is_masking=is_masking, detectors=detectors, pdf_mode=pdf_mode)
+    with open(output_path, 'wb') as output:
+        shutil.copyfileobj(result, output)
+    result.close()
+
+    # Contadores do cache de células desta entrada, somados aos do processo principal
+    cache_after = get_cell_cache_stats()
+    cache_stats = (cache_after['hits'] - cache_before['hits'], cache_after['misses'] - cache_before['misses'])
+
+    # Se os mapeamentos passaram para o disco, apenas o caminho do arquivo volta
+    # ao processo principal, que o remove depois de incorporá-los
+    return (session_data if is_masking else None), cache_stats
+
+def _unique_name(name, used):
+    candidate = name
+    index = 1
+    while candidate in used:
+        stem, ext = os.path.splitext(name)
+        candidate = f"{stem}_{index}{ext}"
+        index += 1
+    used.add(candidate)
+    return candidate
+
+def save_batch_inputs(files, work_dir):
+    # Aceita vários arquivos ou um único .zip. Devolve as entradas suportadas e o
+    # manifesto de sessões, se o zip for a saída de um mascaramento em lote.
+    entries = []
+    manifest = {}
+    used = set()
+
+    def add_entry(name, source):
+        name = _unique_name(name, used)
+        input_path = os.path.join(work_dir, f"input_{len(entries)}_{name}")
+        with open(input_path, 'wb') as target:
+            shutil.copyfileobj(source, target)
+        entries.append({'name': name, 'format': name.rsplit('.', 1)[1].lower(), 'input_path': input_path})
+
+    if len(files) == 1 and files[0].filename.lower().endswith('.zip'):
+        with zipfile.ZipFile(files[0].stream) as archive:
+            items = []
+            for item in archive.infolist():
+                if item.is_dir():
+                    continue
+                # Apenas o nome base, para evitar caminhos fora do diretório de trabalho
+                name = secure_filename(os.path.basename(item.filename))
+                if name == MANIFEST_NAME or allowed_file(name):
+                    items.append((name, item))
+
+            # O tamanho declarado é respeitado na extração: o zipfile não lê além dele
+            if len(items) > BATCH_MAX_ENTRIES:
+                raise BatchTooLargeError(f"O arquivo .zip tem mais de {BATCH_MAX_ENTRIES} documentos")
+            if sum(item.file_size for _, item in items) > BATCH_MAX_UNCOMPRESSED_SIZE:
+                raise BatchTooLargeError(f"O conteúdo do arquivo .zip excede {BATCH_MAX_UNCOMPRESSED_SIZE // (1024 * 1024)} MB")
+
+            for name, item in items:
+                if name == MANIFEST_NAME:
+                    manifest = json.loads(archive.read(item))
+                else:
+                    with archive.open(item) as source:
+                        add_entry(name, source)
+    else:
+        if len(files) > BATCH_MAX_ENTRIES:
+            raise BatchTooLargeError(f"O lote tem mais de {BATCH_MAX_ENTRIES} documentos")
+        for file in files:
+            name = secure_filename(file.filename)
+            if allowed_file(name):
+                add_entry(name, file.stream)
+
+    return entries, manifest
+
+def _run_entries(entries, work_dir, prefix, mask_words, detectors, pdf_mode, is_masking, session_args):
+    pool = get_batch_pool()
+    futures = []
+    try:
+        for entry, (token_mode, key, mappings) in zip(entries, session_args):
+            entry['output_name'] = f"{prefix}_{entry['name']}"
+            entry['output_path'] = os.path.join(work_dir, f"output_{entry['output_name']}")
+            futures.append(pool.submit(
+                process_batch_entry, entry['input_path'], entry['output_path'], entry['format'],
+                mask_words, detectors, pdf_mode, is_masking, token_mode, key, mappings
+            ))
+        results = []
+        for future in futures:
+            session_data, cache_stats = future.result()
+            add_cell_cache_stats(*cache_stats)
+            results.append(session_data)
+        return results
+    except BrokenProcessPool:
+        discard_batch_pool(pool)
+        raise
+
+def _build_archive(entries, manifest=None):
+    output = new_output_file()
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for entry in entries:
+            archive.write(entry['output_path'], entry['output_name'])
+        if manifest:
+            archive.writestr(MANIFEST_NAME, json.dumps(manifest, indent=2))
+    output.seek(0)
+    return output
+
+def mask_batch(entries, work_dir, mask_words, user_id, pdf_mode=None, shared_mapping=False):
+    detectors = get_enabled_detectors()
+    mask_words = tuple(mask_words)
+
+    if shared_mapping:
+        # Uma única sessão para todo o lote: a mesma chave em todos os processos
+        # faz com que valores iguais recebam o mesmo token em todos os documentos
+        shared = SessionMappings()
+        sessions = [shared] * len(entries)
+    else:
+        sessions = [SessionMappings() for _ in entries]
+
+    session_args = [(session_data.token_mode, session_data.key, None) for session_data in sessions]
+    results = _run_entries(entries, work_dir, 'masked', mask_words, detectors, pdf_mode, True, session_args)
+
+    manifest = {}
+    shared_session_id = str(uuid.uuid4()) if shared_mapping else None
+    for entry, session_data, mappings in zip(entries, sessions, results):
+        session_data.merge(mappings)
+        mappings.close()
+        entry['session_id'] = shared_session_id or str(uuid.uuid4())
+        manifest[entry['output_name']] = entry['session_id']
+
+        if not shared_mapping:
+            db_session = SessionModel(
+                session_id=entry['session_id'],
+                user_id=user_id,
+                original_filename=entry['name'],
+                file_format=entry['format']
+            )
+            db.session.add(db_session)
+            db_session.save_mappings(session_data)
+            session_data.close()
+
+        db.session.add(DocumentHistory(
+            user_id=user_id,
+            filename=entry['name'],
+            file_format=entry['format'],
+            operation='mask',
+            session_id=entry['session_id']
+        ))
+
+    if shared_mapping:
+        db_session = SessionModel(
+            session_id=shared_session_id,
+            user_id=user_id,
+            original_filename=f"lote de {len(entries)} documentos",
+            file_format=SHARED_SESSION_FORMAT
+        )
+        db.session.add(db_session)
+        db_session.save_mappings(shared)
+        shared.close()
+    db.session.commit()
+
+    # Um único e-mail para o lote inteiro
+    from utils.email_sender import send_document_email
+    user = User.query.get(user_id)
+    send_document_email(user, f"lote de {len(entries)} documentos", 'mascarado', shared_session_id or ', '.join(manifest.values()))
+
+    return _build_archive(entries, manifest), shared_session_id
+
+def shared_session_restored(session_id, manifest, restored_names):
+    # Todos os documentos do manifesto que usam a sessão foram restaurados
+    names = [name for name, item in (manifest or {}).items() if item == session_id]
+    return bool(names) and all(name in restored_names for name in names)
+
+def unmask_batch(entries, work_dir, db_sessions, pdf_mode=None, manifest=None):
+    # db_sessions: uma sessão por entrada, na mesma ordem (sessões compartilhadas se repetem)
+    restored_names = {entry['name'] for entry in entries}
+    # Arquivos vindos de um mascaramento em lote voltam ao nome original
+    for entry in entries:
+        if entry['name'].startswith('masked_'):
+            entry['name'] = entry['name'][len('masked_'):]
+
+    # Cada sessão é lida uma vez, mesmo compartilhada por várias entradas
+    stores = {}
+    for db_session in db_sessions:
+        if db_session.session_id not in stores:
+            stores[db_session.session_id] = db_session.load_mappings()
+    try:
+        # Cada entrada recebe uma cópia serializada dos mapeamentos. Uma sessão usada
+        # por várias entradas passa antes para o disco: só o caminho do arquivo é
+        # enviado, em vez de serializar o dicionário inteiro para cada documento.
+        usage = Counter(db_session.session_id for db_session in db_sessions)
+        for session_id, store in stores.items():
+            if usage[session_id] > 1 and not store.spilled:
+                store.spill()
+        session_args = [('reuse', None, stores[db_session.session_id]) for db_session in db_sessions]
+        _run_entries(entries, work_dir, 'restored', (), None, pdf_mode, False, session_args)
+    finally:
+        for store in stores.values():
+            store.close()
+
+    for entry, db_session in zip(entries, db_sessions):
+        db.session.add(DocumentHistory(
+            user_id=db_session.user_id,
+            filename=entry['name'],
+            file_format=entry['format'],
+            operation='unmask',
+            session_id=db_session.session_id
+        ))
+
+    # Remover as sessões restauradas do banco de dados. A sessão compartilhada de
+    # um lote só é removida quando todo o lote do manifesto foi restaurado; numa
+    # restauração parcial ela continua valendo para os outros documentos até expirar.
+    for db_session in {db_session.session_id: db_session for db_session in db_sessions}.values():
+        if db_session.is_shared and not shared_session_restored(db_session.session_id, manifest, restored_names):
+            continue
+        db.session.delete(db_session)
+    db.session.commit()
+
+    from utils.email_sender import send_document_email
+    user = User.query.get(db_sessions[0].user_id)
+    send_document_email(user, f"lote de {len(entries)} documentos", 'restaurado', ', '.join(sorted({db_session.session_id for db_session in db_sessions})))
+
+    return _build_archive(entries)
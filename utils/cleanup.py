@@ -1,28 +1,244 @@
 import os
 import time
+import logging
+import threading
 from datetime import datetime, timedelta
 from apscheduler.schedulers.background import BackgroundScheduler
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+from utils.database import db
+from utils.db_pool import session_database_url
+from utils.jobs import reap_stale_jobs
+
+logger = logging.getLogger(__name__)
+
+# Arquivos de uploads/ mais antigos que isto (horas) são removidos
+UPLOAD_RETENTION_HOURS = float(os.environ.get('UPLOAD_RETENTION_HOURS', '48'))
+# Intervalo (minutos) entre as varreduras de uploads/
+CLEANUP_INTERVAL_MINUTES = int(os.environ.get('CLEANUP_INTERVAL_MINUTES', '60'))
+# A varredura avança em trechos de no máximo CLEANUP_CHUNK_SECONDS, com uma pausa
+# entre eles para não monopolizar o disco compartilhado
+CLEANUP_CHUNK_SECONDS = float(os.environ.get('CLEANUP_CHUNK_SECONDS', '5'))
+CLEANUP_CHUNK_PAUSE_SECONDS = float(os.environ.get('CLEANUP_CHUNK_PAUSE_SECONDS', '1'))
+
+# Sessões expiradas removidas por transação; lotes pequenos mantêm os locks curtos
+SESSION_PURGE_BATCH_SIZE = int(os.environ.get('SESSION_PURGE_BATCH_SIZE', '500'))
+# Intervalo (minutos) entre as remoções de sessões expiradas
+SESSION_PURGE_INTERVAL_MINUTES = int(os.environ.get('SESSION_PURGE_INTERVAL_MINUTES', '60'))
+
+# Jobs concluídos ou falhos são removidos depois deste prazo (dias); os arquivos de
+# resultado já saem antes, com os demais arquivos de uploads/
+JOB_RETENTION_DAYS = float(os.environ.get('JOB_RETENTION_DAYS', '7'))
+# Intervalo (minutos) entre as verificações de jobs presos em execução
+JOB_REAP_INTERVAL_MINUTES = int(os.environ.get('JOB_REAP_INTERVAL_MINUTES', '5'))
+
+# E-mails enviados ou que esgotaram as tentativas são removidos da caixa de saída
+# depois deste prazo (dias): guardam destinatários e IDs de sessão
+OUTBOX_RETENTION_DAYS = float(os.environ.get('OUTBOX_RETENTION_DAYS', '7'))
+
+# Chave do advisory lock do Postgres que elege o processo responsável pela limpeza
+CLEANUP_LOCK_KEY = 7305915
+
+def cleanup_old_files(upload_folder, hours=UPLOAD_RETENTION_HOURS):
+    # os.scandir já informa o tipo de cada entrada e guarda o stat no DirEntry:
+    # uma única chamada de sistema por arquivo, em vez de isfile + getmtime
+    cutoff = time.time() - hours * 3600
+    files = reclaimed = 0
+    with os.scandir(upload_folder) as entries:
+        deadline = time.monotonic() + CLEANUP_CHUNK_SECONDS
+        for entry in entries:
+            if time.monotonic() >= deadline:
+                time.sleep(CLEANUP_CHUNK_PAUSE_SECONDS)
+                deadline = time.monotonic() + CLEANUP_CHUNK_SECONDS
+            try:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+                if stat.st_mtime < cutoff:
+                    os.remove(entry.path)
+                    files += 1
+                    reclaimed += stat.st_size
+            except FileNotFoundError:
+                # Removido durante a varredura (ex.: job concluído)
+                continue
+    print(f"Limpeza de {upload_folder}: {files} arquivos removidos, {reclaimed / (1024 * 1024):.1f} MB liberados.")
+    return files, reclaimed
+
+def purge_expired_sessions(app, batch_size=SESSION_PURGE_BATCH_SIZE):
+    # Remove as sessões expiradas em lotes, cada um em sua própria transação. As
+    # partes dos mapeamentos saem junto (ON DELETE CASCADE). SKIP LOCKED evita
+    # esperar por sessões em uso por uma restauração.
+    total = 0
+    with app.app_context():
+        while True:
+            result = db.session.execute(text('''
+                DELETE FROM sessions WHERE id IN (
+                    SELECT id FROM sessions WHERE expires_at < :now
+                    ORDER BY expires_at
+                    LIMIT :limit
+                    FOR UPDATE SKIP LOCKED
+                )
+            '''), {'now': datetime.utcnow(), 'limit': batch_size})
+            db.session.commit()
+            total += result.rowcount
+            if result.rowcount < batch_size:
+                break
+    if total:
+        print(f"{total} sessões expiradas removidas.")
+    return total
+
+def purge_old_jobs(app, days=JOB_RETENTION_DAYS, batch_size=SESSION_PURGE_BATCH_SIZE):
+    # Mesmo esquema das sessões: lotes em transações próprias, sem esperar locks
+    total = 0
+    with app.app_context():
+        while True:
+            result = db.session.execute(text('''
+                DELETE FROM jobs WHERE id IN (
+                    SELECT id FROM jobs WHERE status IN ('done', 'failed') AND finished_at < :cutoff
+                    LIMIT :limit
+                    FOR UPDATE SKIP LOCKED
+                )
+            '''), {'cutoff': datetime.utcnow() - timedelta(days=days), 'limit': batch_size})
+            db.session.commit()
+            total += result.rowcount
+            if result.rowcount < batch_size:
+                break
+    if total:
+        print(f"{total} jobs antigos removidos.")
+    return total
+
+def purge_sent_emails(app, days=OUTBOX_RETENTION_DAYS, batch_size=SESSION_PURGE_BATCH_SIZE):
+    # E-mails pendentes ficam até serem enviados ou falharem de vez
+    total = 0
+    with app.app_context():
+        while True:
+            result = db.session.execute(text('''
+                DELETE FROM email_outbox WHERE id IN (
+                    SELECT id FROM email_outbox WHERE status IN ('sent', 'failed') AND created_at < :cutoff
+                    LIMIT :limit
+                    FOR UPDATE SKIP LOCKED
+                )
+            '''), {'cutoff': datetime.utcnow() - timedelta(days=days), 'limit': batch_size})
+            db.session.commit()
+            total += result.rowcount
+            if result.rowcount < batch_size:
+                break
+    if total:
+        print(f"{total} e-mails antigos removidos da caixa de saída.")
+    return total
+
+class CleanupLeader:
+    # Elege um único processo, entre todos os workers e nós, para executar a
+    # limpeza. Quem obtém o advisory lock o mantém em uma conexão dedicada enquanto
+    # estiver vivo; se o processo morrer a conexão cai, o lock é liberado e outro
+    # processo assume na execução seguinte.
+    def __init__(self, engine):
+        self.engine = engine
+        self.connection = None
+        # As tarefas do scheduler podem rodar ao mesmo tempo e compartilham a conexão
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.engine is None:
+            # Sem Postgres não há como coordenar processos: cada um faz a sua limpeza
+            return True
+        with self.lock:
+            return self._acquire()
+
+    def _acquire(self):
+        if self.connection is not None:
+            try:
+                self.connection.execute(text('SELECT 1'))
+                return True
+            except Exception:
+                # Conexão perdida: o lock foi junto e precisa ser disputado de novo
+                self.release()
+
+        connection = self.engine.connect()
+        try:
+            acquired = connection.execute(text('SELECT pg_try_advisory_lock(:key)'), {'key': CLEANUP_LOCK_KEY}).scalar()
+        except Exception:
+            connection.close()
+            raise
+        if not acquired:
+            connection.close()
+            return False
+        self.connection = connection
+        logger.info("Este processo assumiu a limpeza periódica")
+        return True
+
+    def release(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+            self.connection = None
+
+def run_as_leader(leader, func, *args):
+    try:
+        if not leader.acquire():
+            return None
+    except Exception as e:
+        logger.warning(f"Não foi possível disputar a limpeza periódica: {e}")
+        return None
+    return func(*args)
+
+def start_cleanup_scheduler(app):
+    # Todos os processos agendam as tarefas, mas só o eleito as executa
+    with app.app_context():
+        engine = None
+        if db.engine.dialect.name == 'postgresql':
+            # Fora do pool da aplicação e em autocommit, para não manter uma
+            # transação aberta enquanto o lock é mantido
+            engine = create_engine(session_database_url(db.engine.url), poolclass=NullPool, isolation_level='AUTOCOMMIT')
+    leader = CleanupLeader(engine)
 
-def cleanup_old_files(upload_folder, hours=48):
-    now = datetime.now()
-    for filename in os.listdir(upload_folder):
-        file_path = os.path.join(upload_folder, filename)
-        if os.path.isfile(file_path):
-            file_mtime = datetime.fromtimestamp(os.path.getmtime(file_path))
-            if now - file_mtime > timedelta(hours=hours):
-                os.remove(file_path)
-                print(f"Arquivo {filename} removido por ter mais de {hours} horas.")
-
-def start_cleanup_scheduler(upload_folder):
     scheduler = BackgroundScheduler()
     scheduler.add_job(
-        func=cleanup_old_files,
-        args=[upload_folder],
+        func=run_as_leader,
+        args=[leader, cleanup_old_files, app.config['UPLOAD_FOLDER']],
         trigger='interval',
-        hours=24,
+        minutes=CLEANUP_INTERVAL_MINUTES,
         id='cleanup_old_files',
         name='Clean up old files',
         replace_existing=True
     )
+    scheduler.add_job(
+        func=run_as_leader,
+        args=[leader, purge_expired_sessions, app],
+        trigger='interval',
+        minutes=SESSION_PURGE_INTERVAL_MINUTES,
+        id='purge_expired_sessions',
+        name='Purge expired sessions',
+        replace_existing=True
+    )
+    scheduler.add_job(
+        func=run_as_leader,
+        args=[leader, purge_old_jobs, app],
+        trigger='interval',
+        minutes=SESSION_PURGE_INTERVAL_MINUTES,
+        id='purge_old_jobs',
+        name='Purge old jobs',
+        replace_existing=True
+    )
+    scheduler.add_job(
+        func=run_as_leader,
+        args=[leader, purge_sent_emails, app],
+        trigger='interval',
+        minutes=SESSION_PURGE_INTERVAL_MINUTES,
+        id='purge_sent_emails',
+        name='Purge sent emails',
+        replace_existing=True
+    )
+    scheduler.add_job(
+        func=run_as_leader,
+        args=[leader, reap_stale_jobs, app],
+        trigger='interval',
+        minutes=JOB_REAP_INTERVAL_MINUTES,
+        id='reap_stale_jobs',
+        name='Fail jobs stuck in running',
+        replace_existing=True
+    )
     scheduler.start()
     return scheduler
\ No newline at end of file
@@ -0,0 +1,114 @@
+import os
+import time
+import select
+import logging
+import threading
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+from utils.database import db
+from utils.db_pool import session_database_url
+
+logger = logging.getLogger(__name__)
+
+# Tempo máximo (segundos) que uma configuração fica em cache sem ser relida do banco
+CONFIG_CACHE_TTL = float(os.environ.get('CONFIG_CACHE_TTL', '300'))
+
+# Canal do Postgres usado para avisar os demais processos sobre alterações
+CONFIG_CHANNEL = 'config_changed'
+
+_caches = {}
+_listener = None
+
+class ConfigCache:
+    # Guarda o resultado do loader (um valor simples, não uma instância do ORM)
+    # até expirar o TTL ou até ser invalidado por uma alteração
+    def __init__(self, name, loader, ttl=CONFIG_CACHE_TTL):
+        self.name = name
+        self.loader = loader
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._value = None
+        self._expires_at = 0
+        # Incrementado a cada invalidação: um valor lido antes dela é descartado
+        self._generation = 0
+
+    def get(self):
+        if time.monotonic() < self._expires_at:
+            return self._value
+        with self._lock:
+            if time.monotonic() >= self._expires_at:
+                generation = self._generation
+                value = self.loader()
+                self._value = value
+                # Uma alteração avisada durante a leitura pode não estar no valor
+                # lido: ele é devolvido, mas não fica em cache
+                if generation == self._generation:
+                    self._expires_at = time.monotonic() + self.ttl
+                return value
+        return self._value
+
+    def invalidate(self):
+        self._generation += 1
+        self._expires_at = 0
+
+def config_cache(name, loader):
+    cache = ConfigCache(name, loader)
+    _caches[name] = cache
+    return cache
+
+def invalidate_config(name=None):
+    for cache_name, cache in _caches.items():
+        if name is None or cache_name == name:
+            cache.invalidate()
+
+def notify_config_changed(name):
+    # Chamado depois do commit da alteração: invalida o cache deste processo e
+    # avisa os demais processos (inclusive em outros nós) pelo NOTIFY do Postgres
+    invalidate_config(name)
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(text('SELECT pg_notify(:channel, :name)'), {'channel': CONFIG_CHANNEL, 'name': name})
+        db.session.commit()
+
+def _listen(engine):
+    connection = engine.raw_connection()
+    try:
+        dbapi_connection = connection.driver_connection
+        dbapi_connection.autocommit = True
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f'LISTEN {CONFIG_CHANNEL}')
+
+        # Alterações feitas enquanto o processo estava desconectado não foram recebidas
+        invalidate_config()
+
+        while True:
+            if select.select([dbapi_connection], [], [], 60) == ([], [], []):
+                continue
+            dbapi_connection.poll()
+            while dbapi_connection.notifies:
+                invalidate_config(dbapi_connection.notifies.pop(0).payload)
+    finally:
+        connection.close()
+
+def _listener_loop(engine):
+    while True:
+        try:
+            _listen(engine)
+        except Exception as e:
+            logger.warning(f"Conexão de invalidação de configurações perdida: {e}")
+            time.sleep(5)
+
+def start_config_listener(app):
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    with app.app_context():
+        if db.engine.dialect.name != 'postgresql':
+            # Sem NOTIFY, os demais processos dependem apenas do TTL
+            return None
+        # Conexão dedicada, fora do pool da aplicação, mantida aberta para o LISTEN
+        engine = create_engine(session_database_url(db.engine.url), poolclass=NullPool)
+
+    _listener = threading.Thread(target=_listener_loop, args=(engine,), name='config-listener', daemon=True)
+    _listener.start()
+    return _listener
@@ -1,6 +1,36 @@
 import os
+import time
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
 
-db = SQLAlchemy()
\ No newline at end of file
+db = SQLAlchemy()
+
+def database_uri():
+    return (
+        f"postgresql://{os.environ.get('POSTGRES_USER', 'postgres')}:"
+        f"{os.environ.get('POSTGRES_PASSWORD', 'postgres')}@"
+        f"{os.environ.get('POSTGRES_HOST', 'db')}:"
+        f"{os.environ.get('POSTGRES_PORT', '5432')}/"
+        f"{os.environ.get('POSTGRES_DB', 'masking_app')}"
+    )
+
+# Esperar o banco de dados estar pronto (usado pelos comandos de manutenção,
+# não pela aplicação, que sinaliza a indisponibilidade em /readyz)
+def wait_for_db(app, max_retries=10, delay=5):
+    retry_count = 0
+    
+    while retry_count < max_retries:
+        try:
+            with app.app_context():
+                with db.engine.connect():
+                    pass
+            print("Banco de dados está pronto!")
+            return True
+        except Exception as e:
+            print(f"Tentativa {retry_count + 1}/{max_retries}: Aguardando banco de dados... Erro: {e}")
+            retry_count += 1
+            time.sleep(delay)
+    
+    print("Não foi possível conectar ao banco de dados após várias tentativas.")
+    return False
\ No newline at end of file
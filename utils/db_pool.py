@@ -0,0 +1,144 @@
+import os
+import time
+import threading
+from bisect import bisect_left
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool, NullPool
+
+# Pool de conexões da aplicação. É por processo: cada worker do gunicorn tem o
+# seu, então o total de conexões é workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW).
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', '10'))
+# Segundos aguardando uma conexão livre antes de falhar a requisição
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '30'))
+# Conexões abertas há mais tempo que isso (segundos) são reabertas; -1 desativa
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', '1800'))
+# Testa cada conexão antes de entregá-la, descartando as derrubadas por um
+# restart do Postgres em vez de falhar a requisição
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'on')
+
+# Modo PgBouncer (pool_mode = transaction): POSTGRES_HOST/PORT apontam para o
+# PgBouncer, que mantém o pool; a aplicação abre uma conexão com ele a cada uso.
+# LISTEN e advisory locks dependem da sessão do Postgres, que não é preservada
+# entre transações, então essas conexões vão direto a POSTGRES_DIRECT_HOST/PORT.
+DB_PGBOUNCER = os.environ.get('DB_PGBOUNCER', 'false').lower() in ('1', 'true', 'on')
+POSTGRES_DIRECT_HOST = os.environ.get('POSTGRES_DIRECT_HOST') or None
+POSTGRES_DIRECT_PORT = os.environ.get('POSTGRES_DIRECT_PORT') or None
+
+# Limites (segundos) do histograma de espera por uma conexão do pool
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30)
+
+class PoolMetrics:
+    # Contadores do pool deste processo, desde o início ou o último reset()
+    def __init__(self, buckets=WAIT_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.wait_counts = [0] * (len(self.buckets) + 1)
+            self.wait_sum = 0.0
+            self.checkouts = 0
+            self.timeouts = 0
+            self.connects = 0
+            self.invalidations = 0
+
+    def observe_wait(self, elapsed, timed_out=False):
+        with self.lock:
+            self.wait_counts[bisect_left(self.buckets, elapsed)] += 1
+            self.wait_sum += elapsed
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+
+    def count(self, name):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self, pool):
+        with self.lock:
+            # Histograma cumulativo, no formato do Prometheus: espera <= limite
+            histogram = {}
+            total = 0
+            for bound, count in zip(self.buckets + (None,), self.wait_counts):
+                total += count
+                histogram['+Inf' if bound is None else str(bound)] = total
+            metrics = {
+                "pid": os.getpid(),
+                "pool_class": type(pool).__name__,
+                "pgbouncer": DB_PGBOUNCER,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "wait_seconds": {"buckets": histogram, "count": total, "sum": round(self.wait_sum, 6)},
+            }
+
+        if isinstance(pool, QueuePool):
+            metrics.update({
+                "size": pool.size(),
+                "max_overflow": DB_MAX_OVERFLOW,
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                # overflow() é negativo enquanto o pool não atingiu pool_size
+                "overflow": max(pool.overflow(), 0),
+            })
+        return metrics
+
+pool_metrics = PoolMetrics()
+
+class _WaitTimingPool:
+    # Mede o tempo de cada checkout: espera por uma conexão livre e, quando o
+    # pool ainda não está cheio, a abertura de uma nova
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            pool_metrics.observe_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        pool_metrics.observe_wait(time.perf_counter() - start)
+        return connection
+
+# Os logs continuam sob sqlalchemy.pool, com o nível configurado pelo SQLAlchemy
+class InstrumentedQueuePool(_WaitTimingPool, QueuePool):
+    _sqla_logger_namespace = 'sqlalchemy.pool.impl.QueuePool'
+
+class InstrumentedNullPool(_WaitTimingPool, NullPool):
+    _sqla_logger_namespace = 'sqlalchemy.pool.impl.NullPool'
+
+for _pool_class in (InstrumentedQueuePool, InstrumentedNullPool):
+    event.listen(_pool_class, 'connect', lambda *args: pool_metrics.count('connects'))
+    # Conexões descartadas: pre-ping falhou, erro de desconexão ou recycle
+    event.listen(_pool_class, 'invalidate', lambda *args: pool_metrics.count('invalidations'))
+
+def engine_options(uri):
+    # SQLALCHEMY_ENGINE_OPTIONS da aplicação. As opções do pool valem apenas para
+    # o Postgres; outros bancos (ex.: SQLite nos testes) ficam com o padrão.
+    if make_url(uri).get_backend_name() != 'postgresql':
+        return {}
+    if DB_PGBOUNCER:
+        # O psycopg2 não usa prepared statements no servidor, então nada mais
+        # precisa ser desativado para o modo transaction do PgBouncer
+        return {'poolclass': InstrumentedNullPool}
+    return {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': DB_POOL_PRE_PING,
+    }
+
+def session_database_url(url):
+    # URL das conexões dedicadas que mantêm estado de sessão (LISTEN, advisory locks)
+    if not DB_PGBOUNCER:
+        return url
+    return url.set(
+        host=POSTGRES_DIRECT_HOST or url.host,
+        port=int(POSTGRES_DIRECT_PORT) if POSTGRES_DIRECT_PORT else url.port,
+    )
@@ -0,0 +1,83 @@
+from collections import OrderedDict
+
+# Registro de detectores de dados sensíveis. A ordem de registro define a
+# prioridade quando dois detectores reconhecem o mesmo trecho do texto.
+DETECTORS = OrderedDict()
+
+class Detector:
+    def __init__(self, name, prefix, pattern, label, validator=None):
+        self.name = name
+        self.prefix = prefix
+        self.pattern = pattern
+        self.label = label
+        self.validator = validator
+
+    def __repr__(self):
+        return f'<Detector {self.name}>'
+
+def register_detector(name, prefix, pattern, label, validator=None):
+    DETECTORS[name] = Detector(name, prefix, pattern, label, validator)
+    return DETECTORS[name]
+
+def _digits(value):
+    return [int(char) for char in value if char.isdigit()]
+
+def _check_digit(digits, weights):
+    remainder = sum(digit * weight for digit, weight in zip(digits, weights)) % 11
+    return 0 if remainder < 2 else 11 - remainder
+
+def is_valid_cpf(value):
+    digits = _digits(value)
+    if len(digits) != 11 or len(set(digits)) == 1:
+        return False
+    for size in (9, 10):
+        if _check_digit(digits[:size], range(size + 1, 1, -1)) != digits[size]:
+            return False
+    return True
+
+def is_valid_cnpj(value):
+    digits = _digits(value)
+    if len(digits) != 14 or len(set(digits)) == 1:
+        return False
+    weights = [5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]
+    if _check_digit(digits[:12], weights) != digits[12]:
+        return False
+    return _check_digit(digits[:13], [6] + weights) == digits[13]
+
+def is_valid_pis(value):
+    digits = _digits(value)
+    if len(digits) != 11 or len(set(digits)) == 1:
+        return False
+    return _check_digit(digits[:10], [3, 2, 9, 8, 7, 6, 5, 4, 3, 2]) == digits[10]
+
+# CNPJ: XX.XXX.XXX/XXXX-XX
+register_detector('CNPJ', 'CNPJ', r'\b\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2}\b', 'CNPJ formatado')
+# CPF: XXX.XXX.XXX-XX
+register_detector('CPF', 'CPF', r'\b\d{3}\.\d{3}\.\d{3}-\d{2}\b', 'CPF formatado')
+# PIS/PASEP: XXX.XXXXX.XX-X
+register_detector('PIS', 'PIS', r'\b\d{3}\.\d{5}\.\d{2}-\d\b', 'PIS/PASEP', is_valid_pis)
+# RG (formato mais comum): XX.XXX.XXX-X
+register_detector('RG', 'RG', r'\b\d{1,2}\.\d{3}\.\d{3}-[\dXx]\b', 'RG')
+# CNPJ e CPF sem formatação, apenas com dígitos verificadores válidos
+register_detector('CNPJ_DIGITS', 'CNPJ', r'\b\d{14}\b', 'CNPJ sem formatação', is_valid_cnpj)
+register_detector('CPF_DIGITS', 'CPF', r'\b\d{11}\b', 'CPF sem formatação', is_valid_cpf)
+register_detector('EMAIL', 'EMAIL', r'\b[\w.%+-]+@[\w-]+(?:\.[\w-]+)*\.[A-Za-z]{2,}\b', 'E-mail')
+# Telefone: +55 (XX) 9XXXX-XXXX, (XX) XXXX-XXXX, XX 9XXXX-XXXX ou 9XXXX-XXXX.
+# Sem DDD, apenas celulares: XXXX-XXXX sozinho é comum demais (anos, processos).
+register_detector('PHONE', 'PHONE', r'(?<![\w(+])(?:(?:\+55\s?)?(?:\(\d{2}\)\s?|\d{2}\s)9?\d{4}|9\d{4})-\d{4}\b', 'Telefone')
+# CEP: XXXXX-XXX ou XX.XXX-XXX
+register_detector('CEP', 'CEP', r'\b\d{2}\.?\d{3}-\d{3}\b', 'CEP')
+
+# Detectores usados enquanto o administrador não escolher outros: os padrões
+# mascarados desde as primeiras versões. Os demais precisam ser ativados.
+DEFAULT_DETECTORS = ('CNPJ', 'CPF')
+
+def get_default_detectors():
+    return normalize_detectors(DEFAULT_DETECTORS)
+
+def normalize_detectors(names):
+    # Manter a ordem de prioridade do registro e descartar nomes desconhecidos
+    if names is None:
+        return get_default_detectors()
+    requested = set(names)
+    return tuple(name for name in DETECTORS if name in requested)
@@ -0,0 +1,91 @@
+import uuid
+from utils.database import db
+from models import User, DocumentHistory, Session as SessionModel
+from utils.file_processor import process_document
+from utils.masking_engine import SessionMappings
+from utils.system_config import get_enabled_detectors
+
+# Operações de mascaramento e restauração compartilhadas pelas rotas síncronas
+# e pelos workers de jobs em segundo plano
+
+def mask_document(source, filename, file_format, mask_words, user_id, pdf_mode=None):
+    session_id = str(uuid.uuid4())
+    session_data = SessionMappings()
+
+    # Detectores de dados sensíveis habilitados pelo administrador
+    detectors = get_enabled_detectors()
+
+    try:
+        processed_file = process_document(source, file_format, mask_words, session_data, is_masking=True, detectors=detectors, pdf_mode=pdf_mode)
+
+        # Salvar sessão no banco de dados
+        db_session = SessionModel(
+            session_id=session_id,
+            user_id=user_id,
+            original_filename=filename,
+            file_format=file_format
+        )
+        db.session.add(db_session)
+        db_session.save_mappings(session_data)
+    finally:
+        session_data.close()
+
+    # Registrar no histórico
+    history_record = DocumentHistory(
+        user_id=user_id,
+        filename=filename,
+        file_format=file_format,
+        operation='mask',
+        session_id=session_id
+    )
+    db.session.add(history_record)
+    db.session.commit()
+
+    # Enviar e-mail com informações do documento
+    from utils.email_sender import send_document_email
+    user = User.query.get(user_id)
+    send_document_email(user, filename, 'mascarado', session_id)
+
+    return processed_file, session_id
+
+def restored_filename(db_session, filename):
+    # A sessão compartilhada de um lote não guarda o nome de cada documento: vale
+    # o nome do arquivo enviado, sem o prefixo do mascaramento em lote
+    if db_session.is_shared:
+        return filename[len('masked_'):] if filename.startswith('masked_') else filename
+    return db_session.original_filename
+
+def unmask_document(source, filename, file_format, db_session, pdf_mode=None):
+    # O formato vem do arquivo enviado, e não da sessão: a sessão de um lote
+    # compartilhado restaura documentos de qualquer formato
+    session_id = db_session.session_id
+    original_filename = restored_filename(db_session, filename)
+
+    session_data = db_session.load_mappings()
+    try:
+        restored_file = process_document(source, file_format, [], session_data, is_masking=False, pdf_mode=pdf_mode)
+    finally:
+        session_data.close()
+
+    # Registrar no histórico
+    history_record = DocumentHistory(
+        user_id=db_session.user_id,
+        filename=original_filename,
+        file_format=file_format,
+        operation='unmask',
+        session_id=session_id
+    )
+    db.session.add(history_record)
+
+    # Remover sessão do banco de dados. A de um lote compartilhado ainda serve
+    # aos outros documentos do lote e fica até expirar.
+    if not db_session.is_shared:
+        db.session.delete(db_session)
+    db.session.commit()
+
+    # Enviar e-mail com informações do documento
+    from utils.email_sender import send_document_email
+    user = User.query.get(db_session.user_id)
+    send_document_email(user, original_filename, 'restaurado', session_id)
+
+    return restored_file
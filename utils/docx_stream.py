@@ -0,0 +1,130 @@
+import io
+import re
+import codecs
+import shutil
+import zipfile
+import tempfile
+from html import unescape
+from xml.sax.saxutils import escape
+
+# Partes do pacote OOXML que contêm texto do documento (corpo, tabelas e caixas
+# de texto ficam em document.xml)
+TEXT_PARTS = re.compile(r'^word/(document|header\d*|footer\d*|footnotes|endnotes|comments)\.xml$')
+
+TAG_SPLIT = re.compile(r'(<[^>]*>)')
+PARAGRAPH_TAG = re.compile(r'</?w:p(?:\s[^>]*)?/?>')
+TEXT_OPEN_TAG = re.compile(r'<w:(?:t|delText)(?:\s[^>]*)?(?<!/)>')
+TEXT_CLOSE_TAG = re.compile(r'</w:(?:t|delText)>')
+
+CHUNK_SIZE = 64 * 1024
+
+def distribute_replacements(texts, replacements):
+    # Aplica substituições calculadas sobre o texto concatenado de um parágrafo
+    # aos nós <w:t> originais: o novo valor fica no nó onde o trecho começa e os
+    # caracteres restantes do trecho são removidos dos nós seguintes, preservando
+    # a formatação de todo o resto do parágrafo.
+    result = []
+    index = 0
+    node_start = 0
+    for text in texts:
+        node_end = node_start + len(text)
+        pieces = []
+        position = node_start
+        while index < len(replacements) and replacements[index][0] < node_end:
+            start, end, value = replacements[index]
+            if start >= node_start:
+                pieces.append(text[position - node_start:start - node_start])
+                pieces.append(value)
+            position = min(end, node_end)
+            if end > node_end:
+                break
+            index += 1
+        pieces.append(text[position - node_start:])
+        result.append(''.join(pieces))
+        node_start = node_end
+    return result
+
+class _PartRewriter:
+    def __init__(self, output, find_replacements):
+        self.output = output
+        self.find_replacements = find_replacements
+        self.pieces = []
+        self.text_nodes = []
+        self.in_text = False
+
+    def feed(self, data):
+        for piece in TAG_SPLIT.split(data):
+            if not piece:
+                continue
+            if piece[0] == '<':
+                if PARAGRAPH_TAG.fullmatch(piece):
+                    self.flush()
+                elif TEXT_OPEN_TAG.fullmatch(piece):
+                    self.in_text = True
+                elif TEXT_CLOSE_TAG.fullmatch(piece):
+                    self.in_text = False
+            elif self.in_text:
+                self.text_nodes.append(len(self.pieces))
+
+            if self.text_nodes:
+                self.pieces.append(piece)
+            else:
+                # Nada a alterar antes do primeiro texto do parágrafo: escrever direto
+                self.output.write(piece)
+
+    def flush(self):
+        if self.text_nodes:
+            texts = [unescape(self.pieces[index]) for index in self.text_nodes]
+            replacements = self.find_replacements(''.join(texts))
+            if replacements:
+                for index, old, new in zip(self.text_nodes, texts, distribute_replacements(texts, replacements)):
+                    if new != old:
+                        self.pieces[index] = escape(new)
+            self.output.write(''.join(self.pieces))
+        self.pieces = []
+        self.text_nodes = []
+
+def _rewrite_part(source, target, find_replacements):
+    output = io.TextIOWrapper(target, encoding='utf-8', newline='')
+    rewriter = _PartRewriter(output, find_replacements)
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    pending = ''
+
+    while True:
+        chunk = source.read(CHUNK_SIZE)
+        data = pending + decoder.decode(chunk, final=not chunk)
+        if chunk:
+            # Processar apenas até a última tag completa; o restante aguarda o próximo bloco
+            cut = data.rfind('>') + 1
+            pending = data[cut:]
+            data = data[:cut]
+        rewriter.feed(data)
+        if not chunk:
+            break
+
+    rewriter.flush()
+    output.flush()
+    output.detach()
+
+def rewrite_docx(file_path, find_replacements, output=None):
+    # Percorre o pacote DOCX parte a parte: as partes de texto são reescritas em
+    # streaming e todas as demais (imagens, estilos, relações) são copiadas sem
+    # alteração. Sem destino informado, o resultado vai para um arquivo temporário.
+    if output is None:
+        output = tempfile.TemporaryFile()
+
+    with zipfile.ZipFile(file_path) as source, zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as target:
+        for item in source.infolist():
+            info = zipfile.ZipInfo(item.filename, date_time=item.date_time)
+            info.compress_type = item.compress_type
+            info.external_attr = item.external_attr
+            force_zip64 = item.file_size >= zipfile.ZIP64_LIMIT
+
+            with source.open(item) as source_part, target.open(info, 'w', force_zip64=force_zip64) as target_part:
+                if TEXT_PARTS.match(item.filename):
+                    _rewrite_part(source_part, target_part, find_replacements)
+                else:
+                    shutil.copyfileobj(source_part, target_part, CHUNK_SIZE)
+
+    output.seek(0)
+    return output
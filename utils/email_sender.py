@@ -1,9 +1,18 @@
+import os
+import time
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from models.email_config import EmailConfig
+from utils.config_cache import config_cache
 
-def get_email_config():
+# Conexões SMTP ociosas por mais que este tempo (segundos) são fechadas e reabertas
+SMTP_IDLE_TIMEOUT = int(os.environ.get('SMTP_IDLE_TIMEOUT', '60'))
+# Tempo máximo (segundos) de cada operação com o servidor SMTP. Sem ele, um
+# servidor travado prende o remetente, e os locks da caixa de saída, indefinidamente.
+SMTP_TIMEOUT = float(os.environ.get('SMTP_TIMEOUT', '30'))
+
+def _load_email_config():
     config = EmailConfig.query.first()
     if not config:
         return None
@@ -16,39 +25,110 @@ def get_email_config():
         'from_email': config.from_email
     }
 
+# Lida do banco apenas quando o cache expira ou é invalidado por /admin/email-config
+_email_config = config_cache('email_config', _load_email_config)
+
+def get_email_config():
+    return _email_config.get()
+
+def build_message(config, to, subject, body, html_body=None):
+    msg = MIMEMultipart('alternative')
+    msg['From'] = config['from_email']
+    msg['To'] = to
+    msg['Subject'] = subject
+    
+    # Adicionar corpo em texto plano
+    msg.attach(MIMEText(body, 'plain'))
+    
+    # Adicionar corpo em HTML, se fornecido
+    if html_body:
+        msg.attach(MIMEText(html_body, 'html'))
+    
+    return msg
+
+class SMTPConnection:
+    # Conexão SMTP reaproveitada entre envios: STARTTLS e login acontecem uma vez
+    # por conexão. É reaberta quando a configuração muda, quando o servidor a
+    # encerra ou depois de ficar ociosa por mais de SMTP_IDLE_TIMEOUT segundos.
+    def __init__(self, idle_timeout=SMTP_IDLE_TIMEOUT, timeout=SMTP_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.server = None
+        self.config = None
+        self.last_used = 0
+    
+    def _connect(self, config):
+        server = smtplib.SMTP(config['smtp_server'], config['smtp_port'], timeout=self.timeout)
+        try:
+            if config['use_tls']:
+                server.starttls()
+            server.login(config['smtp_username'], config['smtp_password'])
+        except Exception:
+            server.close()
+            raise
+        self.server = server
+        self.config = config
+    
+    def send(self, config, msg):
+        if self.server is not None and (config != self.config or time.monotonic() - self.last_used > self.idle_timeout):
+            self.close()
+        
+        if self.server is None:
+            self._connect(config)
+            self.server.send_message(msg)
+        else:
+            try:
+                self.server.send_message(msg)
+            except smtplib.SMTPServerDisconnected:
+                # O servidor encerrou a conexão reaproveitada; tentar uma vez com uma nova
+                self.close()
+                self._connect(config)
+                self.server.send_message(msg)
+        
+        self.last_used = time.monotonic()
+    
+    def close(self):
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except Exception:
+                self.server.close()
+        self.server = None
+        self.config = None
+
 def send_email(to, subject, body, html_body=None):
+    # Envio imediato, usado quando o resultado precisa ser conhecido na hora
+    # (ex.: teste da configuração); notificações usam queue_email
     config = get_email_config()
     if not config:
         return False, "Configuração de e-mail não encontrada"
     
+    connection = SMTPConnection()
     try:
-        msg = MIMEMultipart('alternative')
-        msg['From'] = config['from_email']
-        msg['To'] = to
-        msg['Subject'] = subject
-        
-        # Adicionar corpo em texto plano
-        msg.attach(MIMEText(body, 'plain'))
-        
-        # Adicionar corpo em HTML, se fornecido
-        if html_body:
-            msg.attach(MIMEText(html_body, 'html'))
-        
-        # Conectar ao servidor SMTP e enviar o e-mail
-        server = smtplib.SMTP(config['smtp_server'], config['smtp_port'])
-        
-        if config['use_tls']:
-            server.starttls()
-        
-        server.login(config['smtp_username'], config['smtp_password'])
-        server.send_message(msg)
-        server.quit()
-        
+        connection.send(config, build_message(config, to, subject, body, html_body))
         return True, "E-mail enviado com sucesso"
     except Exception as e:
         return False, f"Erro ao enviar e-mail: {str(e)}"
+    finally:
+        connection.close()
+
+def queue_email(to, subject, body, html_body=None):
+    # Grava o e-mail na caixa de saída; o envio é feito em segundo plano
+    from utils.database import db
+    from models import EmailOutbox
+    from utils.outbox import wake_outbox_sender
+    
+    db.session.add(EmailOutbox(to_email=to, subject=subject, body=body, html_body=html_body))
+    db.session.commit()
+    wake_outbox_sender()
+    return True, "E-mail enfileirado para envio"
 
 def send_password_reset_email(user, token):
+    # O e-mail só é enfileirado se puder ser enviado: o usuário não deve ser
+    # avisado de um e-mail de recuperação que nunca vai chegar
+    if not get_email_config():
+        return False, "Configuração de e-mail não encontrada"
+    
     reset_url = f"http://localhost:5000/reset-password/{token}"
     
     subject = "Recuperação de Senha - Data Masking App"
@@ -80,7 +160,7 @@ def send_password_reset_email(user, token):
     </html>
     """
     
-    return send_email(user.email, subject, body, html_body)
+    return queue_email(user.email, subject, body, html_body)
 
 def send_document_email(user, filename, operation, session_id):
     subject = f"Documento {operation} - Data Masking App"
@@ -115,4 +195,4 @@ def send_document_email(user, filename, operation, session_id):
     </html>
     """
     
-    return send_email(user.email, subject, body, html_body)
\ No newline at end of file
+    return queue_email(user.email, subject, body, html_body)
\ No newline at end of file
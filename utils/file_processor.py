@@ -1,132 +1,420 @@
 import os
-import re
-import uuid
+import shutil
 import logging
-from docx import Document
-import openpyxl
-import pdfplumber
-from io import BytesIO
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
+import tempfile
+import importlib
+import threading
+import multiprocessing
+from functools import lru_cache
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections import deque
+from utils.masking_engine import get_masking_engine, restore_tokens, restore_replacements, SessionMappings
+from utils.detectors import normalize_detectors
+from utils.docx_stream import rewrite_docx
 
 # Configurar logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+# O pdfminer registra cada operador do PDF em DEBUG, o que domina o tempo de extração
+logging.getLogger('pdfminer').setLevel(logging.WARNING)
+
+# Bibliotecas de cada formato. São importadas no primeiro documento do formato
+# processado pelo processo, e não no boot: workers que só atendem login e painéis
+# não carregam openpyxl, pdfplumber/pdfminer nem reportlab.
+FORMAT_LIBRARIES = {
+    'docx': ['utils.docx_stream'],
+    'xlsx': ['openpyxl'],
+    'pdf': ['pdfplumber', 'pdfminer.converter', 'pdfminer.pdfinterp', 'pdfminer.pdfpage', 'reportlab.lib.pagesizes', 'utils.pdf_writer'],
+}
+
+# Formatos cujas bibliotecas são carregadas antecipadamente (ex.: 'pdf,xlsx' ou
+# 'all'), para processos dedicados ao processamento de documentos
+PRELOAD_DOCUMENT_LIBRARIES = os.environ.get('PRELOAD_DOCUMENT_LIBRARIES', '')
+
+def preload_document_libraries(formats=PRELOAD_DOCUMENT_LIBRARIES):
+    if formats == 'all':
+        formats = list(FORMAT_LIBRARIES)
+    elif isinstance(formats, str):
+        formats = [file_format.strip() for file_format in formats.split(',') if file_format.strip()]
+    for file_format in formats:
+        for module in FORMAT_LIBRARIES[file_format]:
+            importlib.import_module(module)
+
+# Planilhas acima deste tamanho são processadas em modo streaming
+XLSX_STREAMING_THRESHOLD = int(os.environ.get('XLSX_STREAMING_THRESHOLD_MB', '20')) * 1024 * 1024
+
+# Quantidade máxima de valores distintos memorizados por planilha processada
+XLSX_CELL_CACHE_SIZE = int(os.environ.get('XLSX_CELL_CACHE_SIZE', '50000'))
+
+# Contadores acumulados do cache de células neste processo (inclui os lotes,
+# cujos processos devolvem os próprios contadores), expostos em /metrics/cell-cache
+cell_cache_stats = {'hits': 0, 'misses': 0}
+_cell_cache_lock = threading.Lock()
+
+def default_pool_size():
+    # Processos de cada pool (PDF, lotes) em um worker da aplicação: os núcleos
+    # divididos entre os workers do gunicorn (padrão: um por núcleo), no mínimo 2
+    # e nunca mais que os núcleos. Um pool por núcleo em cada worker somaria
+    # núcleos² processos.
+    cpus = os.cpu_count() or 1
+    workers = int(os.environ.get('GUNICORN_WORKERS') or cpus)
+    return min(cpus, max(2, cpus // max(workers, 1)))
+
+# Processamento paralelo de PDFs: número de processos, páginas por tarefa e
+# tamanho mínimo do documento para compensar o custo de distribuir o trabalho
+PDF_WORKERS = int(os.environ.get('PDF_WORKERS') or default_pool_size())
+PDF_CHUNK_PAGES = int(os.environ.get('PDF_CHUNK_PAGES', '10'))
+PDF_PARALLEL_MIN_PAGES = int(os.environ.get('PDF_PARALLEL_MIN_PAGES', '20'))
+
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+# Modo de extração de texto de PDFs: 'accurate' (pdfplumber, análise de layout
+# completa por caractere) ou 'fast' (pdfminer direto, sem análise de layout)
+PDF_EXTRACTION_MODE = os.environ.get('PDF_EXTRACTION_MODE', 'accurate')
+
+# Arquivos gerados ficam em memória até este tamanho; acima disso vão para o disco.
+# PDF_SPOOL_MAX_SIZE_MB é aceito por compatibilidade com configurações anteriores.
+OUTPUT_SPOOL_MAX_SIZE = int(os.environ.get('OUTPUT_SPOOL_MAX_SIZE_MB', os.environ.get('PDF_SPOOL_MAX_SIZE_MB', '8'))) * 1024 * 1024
+
+def new_output_file():
+    # Destino de todos os processadores: documentos pequenos ficam em memória,
+    # os grandes passam para o disco sem que o chamador precise saber
+    return tempfile.SpooledTemporaryFile(max_size=OUTPUT_SPOOL_MAX_SIZE)
+
+def is_path(source):
+    return isinstance(source, (str, os.PathLike))
+
+def source_size(source):
+    # Tamanho de um caminho ou de um objeto de arquivo, sem alterar a posição de leitura
+    if is_path(source):
+        return os.path.getsize(source)
+    position = source.tell()
+    source.seek(0, os.SEEK_END)
+    size = source.tell()
+    source.seek(position)
+    return size
+
+def open_source(source):
+    # Objetos de arquivo (ex.: o stream do upload) são lidos desde o início
+    if is_path(source):
+        return source
+    source.seek(0)
+    return source
+
+@contextmanager
+def source_as_path(source, suffix=''):
+    # Para quem precisa de um caminho real (ex.: processos do pool), o conteúdo
+    # é copiado para um arquivo temporário exclusivo, removido ao final
+    if is_path(source):
+        yield source
+        return
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    try:
+        with os.fdopen(fd, 'wb') as target:
+            source.seek(0)
+            shutil.copyfileobj(source, target)
+        yield path
+    finally:
+        os.remove(path)
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in {'docx', 'xlsx', 'pdf'}
 
 def mask_cpf_cnpj(text, session_data):
-    # Padrão para CPF: XXX.XXX.XXX-XX
-    cpf_pattern = re.compile(r'\b(\d{3}\.\d{3}\.\d{3}-\d{2})\b')
-    # Padrão para CNPJ: XX.XXX.XXX/XXXX-XX
-    cnpj_pattern = re.compile(r'\b(\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2})\b')
-    
-    # Mascarar CPFs
-    cpfs = cpf_pattern.findall(text)
-    for cpf in cpfs:
-        token = f"[CPF_{uuid.uuid4().hex[:8]}]"
-        session_data[token] = cpf
-        text = text.replace(cpf, token)
-        logger.debug(f"CPF mascarado: {cpf} -> {token}")
-    
-    # Mascarar CNPJs
-    cnpjs = cnpj_pattern.findall(text)
-    for cnpj in cnpjs:
-        token = f"[CNPJ_{uuid.uuid4().hex[:8]}]"
-        session_data[token] = cnpj
-        text = text.replace(cnpj, token)
-        logger.debug(f"CNPJ mascarado: {cnpj} -> {token}")
-    
-    return text
+    # Detectar e mascarar CPF e CNPJ (padrões pré-compilados no registro de detectores)
+    return get_masking_engine((), ('CPF', 'CNPJ')).mask(text, session_data)
+
+def mask_text(text, mask_words, session_data, detectors=None):
+    # Palavras específicas e todos os detectores habilitados são aplicados em uma única varredura do texto
+    return get_masking_engine(mask_words, detectors).mask(text, session_data)
+
+def restore_text(text, session_data):
+    # Localizar todos os tokens com um único padrão pré-compilado, sem percorrer o mapeamento
+    return restore_tokens(text, session_data)
 
-def mask_text(text, mask_words, session_data):
-    logger.debug(f"Texto original: {text}")
+def make_cell_processor(mask_words, session_data, is_masking=True, detectors=None):
+    # Planilhas repetem muito os mesmos valores (nomes, CNPJs, status). O resultado
+    # de cada valor distinto é memorizado por job com descarte LRU; como os tokens
+    # ficam registrados no mapeamento da sessão, reutilizar o texto mascarado é seguro.
+    if is_masking:
+        def process(text):
+            return mask_text(text, mask_words, session_data, detectors)
+    else:
+        def process(text):
+            return restore_text(text, session_data)
+    return lru_cache(maxsize=XLSX_CELL_CACHE_SIZE)(process)
+
+def add_cell_cache_stats(hits, misses):
+    # Planilhas são processadas em paralelo pelas threads do worker
+    with _cell_cache_lock:
+        cell_cache_stats['hits'] += hits
+        cell_cache_stats['misses'] += misses
+
+def get_cell_cache_stats():
+    with _cell_cache_lock:
+        stats = dict(cell_cache_stats)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else None
+    return stats
+
+def record_cell_cache_stats(cell_processor):
+    info = cell_processor.cache_info()
+    add_cell_cache_stats(info.hits, info.misses)
+    logger.info(f"Cache de células: {info.hits} acertos, {info.misses} falhas, {info.currsize} valores")
+
+def process_docx(source, mask_words, session_data, is_masking=True, detectors=None):
+    # Reescreve diretamente o XML de corpo, tabelas, caixas de texto, cabeçalhos,
+    # rodapés, notas e comentários, preservando a formatação dos runs
+    if is_masking:
+        engine = get_masking_engine(mask_words, detectors)
+        return rewrite_docx(source, lambda text: engine.replacements(text, session_data), new_output_file())
+    return rewrite_docx(source, lambda text: restore_replacements(text, session_data), new_output_file())
+
+def process_xlsx(source, mask_words, session_data, is_masking=True, detectors=None):
+    if source_size(source) >= XLSX_STREAMING_THRESHOLD:
+        return process_xlsx_streaming(source, mask_words, session_data, is_masking, detectors)
     
-    # Mascarar palavras específicas
-    for word in mask_words:
-        pattern = re.compile(re.escape(word), re.IGNORECASE)
-        matches = pattern.findall(text)
-        logger.debug(f"Palavras '{word}' encontradas: {matches}")
-        
-        for match in matches:
-            token = f"[MASKED_{uuid.uuid4().hex[:8]}]"
-            session_data[token] = match
-            text = pattern.sub(token, text)
-            logger.debug(f"Palavra mascarada: {match} -> {token}")
+    import openpyxl
+    process_cell = make_cell_processor(mask_words, session_data, is_masking, detectors)
     
-    # Detectar e mascarar CPF e CNPJ
-    text = mask_cpf_cnpj(text, session_data)
+    wb = openpyxl.load_workbook(open_source(source))
+    for sheet in wb:
+        for row in sheet.iter_rows():
+            for cell in row:
+                if cell.value:
+                    cell.value = process_cell(str(cell.value))
     
-    logger.debug(f"Texto final mascarado: {text}")
-    logger.debug(f"Mapeamentos: {session_data}")
+    record_cell_cache_stats(process_cell)
     
-    return text
+    output = new_output_file()
+    wb.save(output)
+    output.seek(0)
+    return output
 
-def restore_text(text, session_data):
-    logger.debug(f"Texto para restaurar: {text}")
-    logger.debug(f"Mapeamentos disponíveis: {session_data}")
+def process_xlsx_streaming(source, mask_words, session_data, is_masking=True, detectors=None):
+    # Leitura linha a linha (read_only) e escrita incremental (write_only): a memória
+    # fica limitada independente do número de linhas. A formatação das células não é
+    # preservada neste modo, apenas os valores.
+    import openpyxl
+    process_cell = make_cell_processor(mask_words, session_data, is_masking, detectors)
     
-    # Ordenar os tokens por comprimento (do maior para o menor)
-    # Isso evita problemas quando um token é substring de outro
-    sorted_tokens = sorted(session_data.keys(), key=len, reverse=True)
-    logger.debug(f"Tokens ordenados: {sorted_tokens}")
+    source = openpyxl.load_workbook(open_source(source), read_only=True)
+    target = openpyxl.Workbook(write_only=True)
     
-    for token in sorted_tokens:
-        original = session_data[token]
-        if token in text:
-            text = text.replace(token, original)
-            logger.debug(f"Token restaurado: {token} -> {original}")
+    try:
+        for sheet in source.worksheets:
+            target_sheet = target.create_sheet(title=sheet.title)
+            for row in sheet.iter_rows(values_only=True):
+                values = []
+                for value in row:
+                    if value:
+                        text = str(value)
+                        processed = process_cell(text)
+                        # Manter o tipo original (número, data) quando nada foi alterado
+                        values.append(processed if processed != text else value)
+                    else:
+                        values.append(value)
+                target_sheet.append(values)
+    finally:
+        source.close()
     
-    logger.debug(f"Texto final restaurado: {text}")
+    record_cell_cache_stats(process_cell)
     
-    return text
+    output = new_output_file()
+    target.save(output)
+    output.seek(0)
+    return output
+
+def get_pdf_pool():
+    global _pdf_pool
+    # Várias threads do worker podem processar PDFs ao mesmo tempo
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            # 'spawn' evita herdar threads e conexões de banco do processo web
+            _pdf_pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=preload_document_libraries, initargs=('pdf',))
+        return _pdf_pool
+
+def discard_pdf_pool(pool):
+    # Um processo do pool morreu (falta de memória, sinal) e o executor ficou
+    # inutilizável: o próximo documento cria um pool novo
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is pool:
+            _pdf_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def extract_pdf_pages_accurate(source, start, end):
+    import pdfplumber
+    with pdfplumber.open(open_source(source)) as pdf:
+        return [page.extract_text() for page in pdf.pages[start:end]]
+
+def _iter_chars(items):
+    from pdfminer.layout import LTChar, LTFigure
+    for item in items:
+        if isinstance(item, LTChar):
+            yield item
+        elif isinstance(item, LTFigure):
+            yield from _iter_chars(item)
+
+def _chars_to_text(page_layout):
+    # Os caracteres chegam na ordem do fluxo de conteúdo; basta uma passada linear
+    # para quebrar linhas quando a altura muda e separar trechos distantes
+    parts = []
+    last = None
+    for char in _iter_chars(page_layout):
+        if last is not None:
+            if abs(char.y0 - last.y0) > last.height / 2:
+                parts.append('\n')
+            elif char.x0 - last.x1 > last.width / 2:
+                parts.append(' ')
+        parts.append(char.get_text())
+        last = char
+    return ''.join(parts)
+
+@contextmanager
+def _open_binary(source):
+    if is_path(source):
+        with open(source, 'rb') as fp:
+            yield fp
+    else:
+        yield open_source(source)
+
+def extract_pdf_pages_fast(source, start, end):
+    # pdfminer sem LAParams: nenhuma análise de layout (agrupamento em linhas e
+    # blocos), que é a etapa mais cara da extração do pdfplumber
+    from pdfminer.converter import PDFPageAggregator
+    from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
+    from pdfminer.pdfpage import PDFPage
+    texts = []
+    with _open_binary(source) as fp:
+        manager = PDFResourceManager(caching=True)
+        device = PDFPageAggregator(manager, laparams=None)
+        interpreter = PDFPageInterpreter(manager, device)
+        for page in PDFPage.get_pages(fp, range(start, end)):
+            interpreter.process_page(page)
+            texts.append(_chars_to_text(device.get_result()))
+    return texts
+
+PDF_EXTRACTORS = {
+    'accurate': extract_pdf_pages_accurate,
+    'fast': extract_pdf_pages_fast,
+}
+
+def extract_pdf_pages(source, start, end, extraction_mode=None):
+    extraction_mode = extraction_mode or PDF_EXTRACTION_MODE
+    if extraction_mode not in PDF_EXTRACTORS:
+        raise ValueError(f"Modo de extração de PDF inválido: {extraction_mode}")
+    return PDF_EXTRACTORS[extraction_mode](source, start, end)
+
+def mask_pdf_pages(source, start, end, mask_words, detectors, token_mode, key, extraction_mode=None):
+    # Executado nos processos do pool: extrai e mascara um intervalo de páginas e
+    # devolve os textos com o mapeamento parcial. Com a mesma chave da sessão, valores
+    # iguais recebem o mesmo token em qualquer processo.
+    session_data = SessionMappings(token_mode=token_mode, key=key)
+    engine = get_masking_engine(mask_words, detectors)
+    texts = [engine.mask(text, session_data) if text else text for text in extract_pdf_pages(source, start, end, extraction_mode)]
+    return texts, session_data
 
-def process_docx(file_path, mask_words, session_data, is_masking=True):
-    doc = Document(file_path)
-    for paragraph in doc.paragraphs:
-        if is_masking:
-            paragraph.text = mask_text(paragraph.text, mask_words, session_data)
+def _process_page_texts(texts, mask_words, session_data, is_masking, detectors):
+    for text in texts:
+        if not text:
+            yield text
+        elif is_masking:
+            yield mask_text(text, mask_words, session_data, detectors)
         else:
-            paragraph.text = restore_text(paragraph.text, session_data)
+            yield restore_text(text, session_data)
+
+def iter_pdf_pages(source, mask_words, session_data, is_masking=True, detectors=None, extraction_mode=None):
+    # Gera o texto processado de cada página, em ordem, à medida que fica pronto.
+    # Apenas alguns intervalos de páginas ficam em memória de cada vez.
+    import pdfplumber
+    with pdfplumber.open(open_source(source)) as pdf:
+        page_count = len(pdf.pages)
+    
+    ranges = [(start, min(start + PDF_CHUNK_PAGES, page_count)) for start in range(0, page_count, PDF_CHUNK_PAGES)]
     
-    buffer = BytesIO()
-    doc.save(buffer)
-    buffer.seek(0)
-    return buffer
+    # Documentos pequenos são processados em série para evitar o custo do pool
+    if PDF_WORKERS <= 1 or page_count < PDF_PARALLEL_MIN_PAGES:
+        for start, end in ranges:
+            texts = extract_pdf_pages(source, start, end, extraction_mode)
+            yield from _process_page_texts(texts, mask_words, session_data, is_masking, detectors)
+        return
+    
+    # Os processos do pool abrem o documento por conta própria e precisam de um caminho
+    with source_as_path(source, '.pdf') as path:
+        yield from _iter_pdf_pages_parallel(path, ranges, mask_words, session_data, is_masking, detectors, extraction_mode)
 
-def process_xlsx(file_path, mask_words, session_data, is_masking=True):
-    wb = openpyxl.load_workbook(file_path)
-    for sheet in wb:
-        for row in sheet.iter_rows():
-            for cell in row:
-                if cell.value:
-                    if is_masking:
-                        cell.value = mask_text(str(cell.value), mask_words, session_data)
-                    else:
-                        cell.value = restore_text(str(cell.value), session_data)
+def _iter_pdf_pages_parallel(source, ranges, mask_words, session_data, is_masking, detectors, extraction_mode):
+    pool = get_pdf_pool()
     
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-    return buffer
-
-def process_pdf(file_path, mask_words, session_data, is_masking=True):
-    buffer = BytesIO()
-    p = canvas.Canvas(buffer, pagesize=letter)
+    if is_masking:
+        if isinstance(session_data, SessionMappings):
+            token_mode, key = session_data.token_mode, session_data.key
+        else:
+            token_mode, key = 'unique', None
+        detectors = normalize_detectors(detectors)
+        
+        def submit(start, end):
+            return pool.submit(mask_pdf_pages, source, start, end, tuple(mask_words), detectors, token_mode, key, extraction_mode)
+    else:
+        # A restauração é barata; só a extração é distribuída
+        def submit(start, end):
+            return pool.submit(extract_pdf_pages, source, start, end, extraction_mode)
     
-    with pdfplumber.open(file_path) as pdf:
-        for page in pdf.pages:
-            text = page.extract_text()
-            if text:
-                if is_masking:
-                    masked_text = mask_text(text, mask_words, session_data)
-                    p.drawString(100, 700, masked_text)
+    # Janela limitada de tarefas em andamento; resultados consumidos na ordem das páginas
+    pending = deque()
+    ranges = iter(ranges)
+    try:
+        for start, end in ranges:
+            pending.append(submit(start, end))
+            if len(pending) >= PDF_WORKERS * 2:
+                break
+        
+        while pending:
+            result = pending.popleft().result()
+            for start, end in ranges:
+                pending.append(submit(start, end))
+                break
+            
+            if is_masking:
+                texts, mappings = result
+                if isinstance(session_data, SessionMappings):
+                    session_data.merge(mappings)
                 else:
-                    restored_text = restore_text(text, session_data)
-                    p.drawString(100, 700, restored_text)
-            p.showPage()
+                    session_data.update(mappings.items())
+                mappings.close()
+                yield from texts
+            else:
+                yield from _process_page_texts(result, mask_words, session_data, False, detectors)
+    except BrokenProcessPool:
+        # Este documento falha, mas os próximos não herdam o pool quebrado
+        discard_pdf_pool(pool)
+        raise
+
+def process_pdf(source, mask_words, session_data, is_masking=True, detectors=None, extraction_mode=None):
+    # Cada página é escrita no arquivo de saída assim que processada
+    from reportlab.lib.pagesizes import letter
+    from utils.pdf_writer import StreamingPDFWriter
+    output = new_output_file()
+    writer = StreamingPDFWriter(output, pagesize=letter)
+    
+    for text in iter_pdf_pages(source, mask_words, session_data, is_masking, detectors, extraction_mode):
+        writer.add_page(text)
     
-    p.save()
-    buffer.seek(0)
-    return buffer
\ No newline at end of file
+    writer.close()
+    output.seek(0)
+    return output
+
+def process_document(source, file_format, mask_words, session_data, is_masking=True, detectors=None, pdf_mode=None):
+    if file_format == 'docx':
+        return process_docx(source, mask_words, session_data, is_masking=is_masking, detectors=detectors)
+    elif file_format == 'xlsx':
+        return process_xlsx(source, mask_words, session_data, is_masking=is_masking, detectors=detectors)
+    elif file_format == 'pdf':
+        return process_pdf(source, mask_words, session_data, is_masking=is_masking, detectors=detectors, extraction_mode=pdf_mode)
+    raise ValueError(f"Formato de arquivo não suportado: {file_format}")
\ No newline at end of file
@@ -0,0 +1,169 @@
+import os
+import queue
+import shutil
+import logging
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from utils.database import db
+from models import Job, Session as SessionModel
+
+logger = logging.getLogger(__name__)
+
+# Quantidade de workers (threads) por processo da aplicação
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+# 'postgres': fila persistida na tabela jobs, compartilhada entre processos e nós
+# 'local': fila em memória do próprio processo (um único processo da aplicação)
+JOB_QUEUE_BACKEND = os.environ.get('JOB_QUEUE_BACKEND', 'postgres')
+# Intervalo máximo entre verificações da fila no banco, em segundos
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', '2'))
+# Jobs em execução há mais tempo que isto (minutos) são considerados perdidos: o
+# processo que os executava morreu (falta de memória, reciclagem do worker)
+JOB_TIMEOUT_MINUTES = float(os.environ.get('JOB_TIMEOUT_MINUTES', '60'))
+
+_local_queue = queue.Queue()
+_wakeup = threading.Event()
+_workers = []
+
+def job_file_path(upload_folder, job_id, kind, file_format):
+    # Nomes únicos por job; ficam na raiz de uploads para a limpeza periódica
+    return os.path.join(upload_folder, f"job_{job_id}_{kind}.{file_format}")
+
+def enqueue_job(job_id):
+    if JOB_QUEUE_BACKEND == 'local':
+        _local_queue.put(job_id)
+    _wakeup.set()
+
+def _claim(job_id):
+    # Transição atômica queued -> running; falha se outro worker já pegou o job
+    result = db.session.execute(
+        text("UPDATE jobs SET status = 'running', started_at = :now WHERE id = :id AND status = 'queued'"),
+        {'id': job_id, 'now': datetime.utcnow()}
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+def _claim_next_postgres():
+    # SKIP LOCKED permite que vários workers, em vários processos, disputem a fila sem bloqueio
+    row = db.session.execute(text('''
+        UPDATE jobs SET status = 'running', started_at = :now
+        WHERE id = (
+            SELECT id FROM jobs WHERE status = 'queued'
+            ORDER BY created_at
+            FOR UPDATE SKIP LOCKED
+            LIMIT 1
+        )
+        RETURNING id
+    '''), {'now': datetime.utcnow()}).first()
+    db.session.commit()
+    return row[0] if row else None
+
+def _claim_next_local():
+    try:
+        job_id = _local_queue.get(timeout=JOB_POLL_INTERVAL)
+    except queue.Empty:
+        return None
+    return job_id if _claim(job_id) else None
+
+def run_job(job_id):
+    from utils.documents import mask_document, unmask_document
+
+    job = Job.query.get(job_id)
+    input_path, result_path = job.input_path, job.result_path
+    session_id = job.session_id
+    status, error = 'done', None
+    try:
+        if job.operation == 'mask':
+            result, session_id = mask_document(job.input_path, job.filename, job.file_format, job.mask_words or [], job.user_id, job.pdf_mode)
+        else:
+            db_session = SessionModel.find_active(job.session_id)
+            if not db_session:
+                raise ValueError("Sessão inválida ou expirada")
+            result = unmask_document(job.input_path, job.filename, job.file_format, db_session, job.pdf_mode)
+
+        with open(job.result_path, 'wb') as output:
+            shutil.copyfileobj(result, output)
+        result.close()
+    except Exception as e:
+        db.session.rollback()
+        status, error = 'failed', str(e)
+        logger.exception(f"Erro ao processar job {job_id}")
+    finally:
+        # Só conclui o job se ele ainda estiver em execução: se reap_stale_jobs já
+        # o marcou como falho, essa decisão (já vista pelo cliente) é mantida.
+        # Os termos mascarados são sensíveis e não servem mais depois do job.
+        updated = Job.query.filter_by(id=job_id, status='running').update({
+            'status': status, 'error': error, 'session_id': session_id,
+            'finished_at': datetime.utcnow(), 'mask_words': db.null()
+        }, synchronize_session=False)
+        db.session.commit()
+        if not updated:
+            logger.warning(f"Job {job_id} terminou depois de ser marcado como falho; resultado descartado")
+            if result_path and os.path.exists(result_path):
+                os.remove(result_path)
+        if input_path and os.path.exists(input_path):
+            os.remove(input_path)
+
+def reap_stale_jobs(app, timeout_minutes=JOB_TIMEOUT_MINUTES):
+    # Marca como falhos os jobs presos em 'running', para que o cliente pare de
+    # consultar /jobs/<id>. Executado periodicamente pela limpeza (um processo só).
+    with app.app_context():
+        now = datetime.utcnow()
+        rows = db.session.execute(text('''
+            UPDATE jobs SET status = 'failed', error = :error, finished_at = :now, mask_words = NULL
+            WHERE status = 'running' AND started_at < :cutoff
+            RETURNING id, input_path
+        '''), {
+            'error': 'Processamento interrompido; envie o arquivo novamente',
+            'now': now,
+            'cutoff': now - timedelta(minutes=timeout_minutes)
+        }).all()
+        db.session.commit()
+
+    for job_id, input_path in rows:
+        logger.warning(f"Job {job_id} excedeu {timeout_minutes:g} minutos em execução e foi marcado como falho")
+        if input_path and os.path.exists(input_path):
+            os.remove(input_path)
+    return len(rows)
+
+def _worker_loop(app):
+    claim_next = _claim_next_local if JOB_QUEUE_BACKEND == 'local' else _claim_next_postgres
+    while True:
+        try:
+            with app.app_context():
+                job_id = claim_next()
+                if job_id is not None:
+                    run_job(job_id)
+                    continue
+        except Exception as e:
+            logger.error(f"Erro no worker de jobs: {e}")
+
+        if JOB_QUEUE_BACKEND != 'local':
+            # Acordar assim que um job for enfileirado neste processo ou, no máximo,
+            # após o intervalo de verificação (jobs enfileirados por outros processos)
+            _wakeup.wait(JOB_POLL_INTERVAL)
+            _wakeup.clear()
+
+def requeue_local_jobs(app):
+    # A fila em memória não sobrevive a um restart: os jobs que ficaram em
+    # 'queued' no banco voltam para a fila do processo que está subindo
+    with app.app_context():
+        job_ids = [job_id for (job_id,) in db.session.query(Job.id).filter_by(status='queued').order_by(Job.created_at)]
+    for job_id in job_ids:
+        _local_queue.put(job_id)
+    if job_ids:
+        logger.info(f"{len(job_ids)} jobs pendentes recolocados na fila local")
+    return len(job_ids)
+
+def start_job_workers(app):
+    if _workers:
+        return _workers
+
+    if JOB_QUEUE_BACKEND == 'local':
+        requeue_local_jobs(app)
+
+    for index in range(JOB_WORKERS):
+        worker = threading.Thread(target=_worker_loop, args=(app,), name=f"job-worker-{index}", daemon=True)
+        worker.start()
+        _workers.append(worker)
+    return _workers
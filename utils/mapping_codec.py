@@ -0,0 +1,134 @@
+import os
+import zlib
+import codecs
+import struct
+from itertools import accumulate, chain, islice
+
+# Formato binário dos mapeamentos token -> original:
+#   'MAP1' | quantidade N (uint32) | com comprimentos (uint8) | [2N comprimentos (uint32)] | textos UTF-8 separados por NUL
+# Os textos são lidos com um único split. Os comprimentos (em caracteres) só são
+# gravados quando algum valor contém NUL. O conjunto é comprimido com zlib.
+MAGIC = b'MAP1'
+HEADER = struct.Struct('<4sIB')
+
+# Nível de compressão zlib (1 = mais rápido, 9 = menor)
+MAPPINGS_COMPRESSION_LEVEL = int(os.environ.get('MAPPINGS_COMPRESSION_LEVEL', '1'))
+
+# Mapeamentos comprimidos maiores que este tamanho vão para a tabela filha
+# session_mapping_chunks, em partes de MAPPINGS_CHUNK_SIZE
+MAPPINGS_INLINE_MAX_SIZE = int(os.environ.get('MAPPINGS_INLINE_MAX_SIZE_KB', '256')) * 1024
+MAPPINGS_CHUNK_SIZE = int(os.environ.get('MAPPINGS_CHUNK_SIZE_KB', '1024')) * 1024
+
+def encode_mappings(mappings):
+    parts = []
+    for token, original in mappings.items():
+        parts.append(token)
+        parts.append(str(original))
+    text = '\0'.join(parts)
+
+    lengths = b''
+    if text.count('\0') != max(len(parts) - 1, 0):
+        lengths = struct.pack(f'<{len(parts)}I', *map(len, parts))
+
+    data = HEADER.pack(MAGIC, len(mappings), bool(lengths)) + lengths + text.encode('utf-8')
+    return zlib.compress(data, MAPPINGS_COMPRESSION_LEVEL)
+
+def _parse_mappings(data):
+    magic, count, has_lengths = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Formato de mapeamentos desconhecido")
+
+    if not has_lengths:
+        parts = data[HEADER.size:].decode('utf-8').split('\0') if count else []
+    else:
+        # Algum valor contém NUL: separar pelos comprimentos gravados
+        lengths = struct.unpack_from(f'<{2 * count}I', data, HEADER.size)
+        text = data[HEADER.size + 8 * count:].decode('utf-8')
+        offsets = accumulate((length + 1 for length in lengths), initial=0)
+        parts = [text[start:start + length] for start, length in zip(offsets, lengths)]
+    return zip(parts[::2], parts[1::2])
+
+def decode_mappings(blob):
+    return dict(_parse_mappings(zlib.decompress(blob)))
+
+def _iter_batches(mappings, batch_size):
+    if hasattr(mappings, 'iter_batches'):
+        return mappings.iter_batches(batch_size)
+    items = iter(mappings.items())
+    return iter(lambda: list(islice(items, batch_size)), [])
+
+def _iter_raw_parts(mappings, batch_size):
+    # Mesmo conteúdo de encode_mappings, produzido lote a lote. Os mapeamentos
+    # são percorridos mais de uma vez, então a ordem precisa ser estável.
+    has_lengths = any(
+        '\0' in token or '\0' in str(original)
+        for batch in _iter_batches(mappings, batch_size)
+        for token, original in batch
+    )
+    yield HEADER.pack(MAGIC, len(mappings), has_lengths)
+
+    if has_lengths:
+        for batch in _iter_batches(mappings, batch_size):
+            lengths = [length for token, original in batch for length in (len(token), len(str(original)))]
+            yield struct.pack(f'<{len(lengths)}I', *lengths)
+
+    separator = ''
+    for batch in _iter_batches(mappings, batch_size):
+        yield (separator + '\0'.join(f'{token}\0{original}' for token, original in batch)).encode('utf-8')
+        separator = '\0'
+
+def iter_encoded_mappings(mappings, chunk_size=MAPPINGS_CHUNK_SIZE, batch_size=10000):
+    # Equivalente a encode_mappings dividido em partes de chunk_size bytes, sem
+    # montar o conjunto inteiro em memória (mapeamentos que passaram para o disco)
+    compressor = zlib.compressobj(MAPPINGS_COMPRESSION_LEVEL)
+    buffer = bytearray()
+    for raw in chain(_iter_raw_parts(mappings, batch_size), [None]):
+        buffer += compressor.compress(raw) if raw is not None else compressor.flush()
+        while len(buffer) >= chunk_size:
+            yield bytes(buffer[:chunk_size])
+            del buffer[:chunk_size]
+    if buffer:
+        yield bytes(buffer)
+
+def _decompress(blobs):
+    decompressor = zlib.decompressobj()
+    for blob in blobs:
+        data = decompressor.decompress(blob)
+        if data:
+            yield data
+    data = decompressor.flush()
+    if data:
+        yield data
+
+def iter_decoded_mappings(blobs):
+    # Lê as partes comprimidas em sequência e devolve lotes de (token, original),
+    # sem manter o conjunto inteiro em memória
+    pieces = _decompress(blobs)
+    data = b''
+    for piece in pieces:
+        data += piece
+        if len(data) >= HEADER.size:
+            break
+    magic, count, has_lengths = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Formato de mapeamentos desconhecido")
+    if not count:
+        return
+
+    if has_lengths:
+        # Caso raro (valores com NUL): os comprimentos precedem os textos, então
+        # o conteúdo é lido por inteiro
+        yield list(_parse_mappings(data + b''.join(pieces)))
+        return
+
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    pending = []
+    tail = ''
+    for piece in chain([data[HEADER.size:]], pieces):
+        parts = (tail + decoder.decode(piece)).split('\0')
+        tail = parts.pop()
+        parts = pending + parts
+        pending = [parts.pop()] if len(parts) % 2 else []
+        if parts:
+            yield list(zip(parts[::2], parts[1::2]))
+    yield [(pending[0], tail + decoder.decode(b'', final=True))]
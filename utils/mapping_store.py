@@ -0,0 +1,190 @@
+import os
+import sqlite3
+import tempfile
+from itertools import islice
+
+# Memória (MB) que os mapeamentos de uma sessão podem ocupar antes de passarem
+# para um arquivo SQLite temporário
+MAPPINGS_MEMORY_BUDGET = int(os.environ.get('MAPPINGS_MEMORY_BUDGET_MB', '256')) * 1024 * 1024
+# Diretório dos arquivos temporários (padrão: diretório temporário do sistema)
+MAPPINGS_SPILL_DIR = os.environ.get('MAPPINGS_SPILL_DIR') or None
+# Entradas por lote nas gravações em disco e na persistência da sessão
+MAPPINGS_BATCH_SIZE = int(os.environ.get('MAPPINGS_BATCH_SIZE', '10000'))
+
+# Custo aproximado de uma entrada em memória além dos próprios textos: objetos
+# str, entrada no dicionário e no índice reverso (valor -> token)
+ENTRY_OVERHEAD = 250
+
+class SQLiteMappingBackend:
+    # Mapeamentos em um arquivo SQLite. As escritas são acumuladas e gravadas em
+    # lotes de MAPPINGS_BATCH_SIZE; o arquivo é removido por close() quando
+    # pertence a este objeto.
+    def __init__(self, path=None, owner=True):
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix='mappings_', suffix='.sqlite', dir=MAPPINGS_SPILL_DIR)
+            os.close(fd)
+        self.path = path
+        self.owner = owner
+        self.pending = {}
+        self._connect('EXCLUSIVE')
+
+    def _connect(self, locking_mode):
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        # Arquivo descartável: sem journal e sem fsync. Enquanto é usado por um
+        # único processo, o lock exclusivo evita readquirir o lock a cada consulta.
+        self.connection.execute('PRAGMA journal_mode = OFF')
+        self.connection.execute('PRAGMA synchronous = OFF')
+        self.connection.execute(f'PRAGMA locking_mode = {locking_mode}')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS mappings (token TEXT PRIMARY KEY, original TEXT NOT NULL) WITHOUT ROWID')
+
+    def get(self, token, default=None):
+        value = self.pending.get(token)
+        if value is not None:
+            return value
+        row = self.connection.execute('SELECT original FROM mappings WHERE token = ?', (token,)).fetchone()
+        return row[0] if row else default
+
+    def __setitem__(self, token, value):
+        self.pending[token] = value
+        if len(self.pending) >= MAPPINGS_BATCH_SIZE:
+            self.flush()
+
+    def update(self, items):
+        self.flush()
+        self.connection.executemany('INSERT OR REPLACE INTO mappings VALUES (?, ?)', items)
+        self.connection.commit()
+
+    def flush(self):
+        if self.pending:
+            self.connection.executemany('INSERT OR REPLACE INTO mappings VALUES (?, ?)', sorted(self.pending.items()))
+            self.connection.commit()
+            self.pending.clear()
+
+    def __len__(self):
+        self.flush()
+        return self.connection.execute('SELECT COUNT(*) FROM mappings').fetchone()[0]
+
+    def iter_batches(self, size):
+        self.flush()
+        # Ordem da chave primária: estável entre leituras, sem ordenação extra
+        cursor = self.connection.execute('SELECT token, original FROM mappings ORDER BY token')
+        while True:
+            batch = cursor.fetchmany(size)
+            if not batch:
+                break
+            yield batch
+
+    def close(self):
+        self.connection.close()
+        if self.owner:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    def __getstate__(self):
+        # Enviado a outro processo: o arquivo é reaberto pelo caminho. O lock
+        # exclusivo só é liberado na próxima leitura depois do modo NORMAL.
+        self.flush()
+        self.connection.execute('PRAGMA locking_mode = NORMAL')
+        self.connection.execute('SELECT COUNT(*) FROM mappings').fetchone()
+        return {'path': self.path, 'owner': self.owner}
+
+    def __setstate__(self, state):
+        self.path = state['path']
+        self.owner = state['owner']
+        self.pending = {}
+        self._connect('NORMAL')
+
+class MappingStore:
+    # Mapeamento token -> valor original usado durante o mascaramento e a
+    # restauração. Fica em um dicionário enquanto couber em memory_budget; acima
+    # disso as entradas passam para um SQLiteMappingBackend.
+    def __init__(self, mappings=None, memory_budget=None):
+        self.memory_budget = MAPPINGS_MEMORY_BUDGET if memory_budget is None else memory_budget
+        self.memory_size = 0
+        self.data = {}
+        # Leituras vão direto ao get do backend atual (dict.get enquanto em memória)
+        self.get = self.data.get
+        if mappings:
+            self.update(mappings)
+
+    @property
+    def spilled(self):
+        return not isinstance(self.data, dict)
+
+    def __setitem__(self, token, value):
+        data = self.data
+        if data.__class__ is dict:
+            if token not in data:
+                self.memory_size += len(token) + len(value) + ENTRY_OVERHEAD
+            data[token] = value
+            if self.memory_size > self.memory_budget:
+                self.spill()
+        else:
+            data[token] = value
+
+    def __getitem__(self, token):
+        value = self.get(token)
+        if value is None:
+            raise KeyError(token)
+        return value
+
+    def __contains__(self, token):
+        return self.get(token) is not None
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        return self.keys()
+
+    def keys(self):
+        for batch in self.iter_batches():
+            for token, _ in batch:
+                yield token
+
+    def items(self):
+        for batch in self.iter_batches():
+            yield from batch
+
+    def iter_batches(self, size=MAPPINGS_BATCH_SIZE):
+        if self.spilled:
+            yield from self.data.iter_batches(size)
+            return
+        items = iter(self.data.items())
+        while True:
+            batch = list(islice(items, size))
+            if not batch:
+                break
+            yield batch
+
+    def update(self, mappings):
+        if hasattr(mappings, 'items'):
+            mappings = mappings.items()
+        for token, value in mappings:
+            self[token] = value
+
+    def spill(self):
+        backend = SQLiteMappingBackend()
+        backend.update(self.data.items())
+        self.data = backend
+        self.get = backend.get
+        self.memory_size = 0
+
+    def close(self):
+        # Libera as entradas e remove o arquivo temporário, se houver
+        if self.spilled:
+            self.data.close()
+        self.data = {}
+        self.get = self.data.get
+        self.memory_size = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['get']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.get = self.data.get
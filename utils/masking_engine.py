@@ -0,0 +1,198 @@
+import os
+import re
+import uuid
+import hashlib
+from functools import lru_cache
+from utils.detectors import DETECTORS, normalize_detectors
+from utils.mapping_store import MappingStore
+
+# Qualquer token gerado pelo motor: [CPF_...], [CNPJ_...], [MASKED_...] etc.
+TOKEN_PATTERN = re.compile(r'\[[A-Z][A-Z_]*_[0-9a-z]+\]')
+
+# 'reuse': valores iguais na mesma sessão recebem o mesmo token
+# 'unique': cada ocorrência recebe um token novo (comportamento anterior)
+TOKEN_MODE = os.environ.get('MASKING_TOKEN_MODE', 'reuse')
+
+def new_token(prefix):
+    return f"[{prefix}_{uuid.uuid4().hex[:8]}]"
+
+class SessionMappings(MappingStore):
+    # Mapeamento token -> valor original de uma sessão, com índice reverso
+    # (prefixo, valor) -> token. No modo 'reuse' os tokens são derivados de um
+    # hash com chave da sessão, então o mapeamento cresce com os valores únicos
+    # e não com o número de ocorrências.
+    def __init__(self, mappings=None, token_mode=None, key=None, memory_budget=None):
+        self.token_mode = token_mode or TOKEN_MODE
+        self.key = key or os.urandom(16)
+        self.index = {}
+        super().__init__(mappings, memory_budget)
+
+    def tokenize(self, prefix, value):
+        if self.token_mode != 'reuse':
+            token = new_token(prefix)
+            self[token] = value
+            return token
+
+        token = self.index.get((prefix, value))
+        if token is None:
+            digest = hashlib.blake2b(value.encode('utf-8'), key=self.key, digest_size=8).hexdigest()
+            token = f"[{prefix}_{digest}]"
+            existing = self.get(token)
+            if existing is None:
+                self[token] = value
+            elif existing != value:
+                # Colisão de hash (improvável): recorrer a um token aleatório
+                token = new_token(prefix)
+                self[token] = value
+            if not self.spilled:
+                self.index[(prefix, value)] = token
+        return token
+
+    def spill(self):
+        # Em disco o índice reverso deixa de ser mantido: o token é recalculado
+        # pelo hash e confirmado no próprio armazenamento
+        super().spill()
+        self.index = {}
+
+    def merge(self, mappings):
+        # Incorporar mapeamentos parciais gerados com a mesma chave (ex.: em outro processo)
+        for token, value in mappings.items():
+            self[token] = value
+            if not self.spilled:
+                self.index.setdefault((token[1:token.rindex('_')], value), token)
+
+    def __getstate__(self):
+        # O índice é reconstruído por merge do lado que recebe os mapeamentos
+        state = super().__getstate__()
+        state['index'] = {}
+        return state
+
+def _build_trie(words):
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+    return trie
+
+def _trie_to_regex(node):
+    # Fatorar prefixos comuns: o regex resultante se comporta como um autômato,
+    # testando cada caractere do texto uma única vez por ramo da árvore
+    alternatives = []
+    single_chars = []
+    for char in sorted(key for key in node if key):
+        suffix = _trie_to_regex(node[char])
+        if suffix:
+            alternatives.append(re.escape(char) + suffix)
+        else:
+            single_chars.append(re.escape(char))
+
+    if single_chars:
+        if len(single_chars) == 1:
+            alternatives.append(single_chars[0])
+        else:
+            alternatives.append('[' + ''.join(single_chars) + ']')
+
+    if not alternatives:
+        return ''
+
+    if len(alternatives) == 1 and '' not in node:
+        return alternatives[0]
+
+    regex = '(?:' + '|'.join(alternatives) + ')'
+    if '' in node:
+        # Palavra termina aqui, mas o sufixo opcional guloso prefere a mais longa
+        regex += '?'
+    return regex
+
+def build_words_regex(words):
+    return _trie_to_regex(_build_trie(words))
+
+class MaskingEngine:
+    def __init__(self, mask_words, detectors):
+        parts = []
+        self.prefixes = {}
+        self.validators = {}
+
+        # A ordem das alternativas define a prioridade: palavras primeiro, depois
+        # os detectores habilitados na ordem do registro. Tudo é combinado em um
+        # único padrão, então o texto é percorrido uma só vez independente de
+        # quantos detectores estejam ativos.
+        if mask_words:
+            parts.append(f"(?P<MASKED>{build_words_regex(mask_words)})")
+            self.prefixes['MASKED'] = 'MASKED'
+        for name in detectors:
+            detector = DETECTORS[name]
+            parts.append(f"(?P<{name}>{detector.pattern})")
+            self.prefixes[name] = detector.prefix
+            if detector.validator:
+                self.validators[name] = detector.validator
+
+        self.pattern = re.compile('|'.join(parts), re.IGNORECASE) if parts else None
+
+    def _token_for(self, match, session_data):
+        group = match.lastgroup
+        value = match.group()
+        validator = self.validators.get(group)
+        if validator and not validator(value):
+            return None
+        if isinstance(session_data, SessionMappings):
+            return session_data.tokenize(self.prefixes[group], value)
+        token = new_token(self.prefixes[group])
+        session_data[token] = value
+        return token
+
+    def mask(self, text, session_data):
+        if self.pattern is None:
+            return text
+
+        def replace(match):
+            token = self._token_for(match, session_data)
+            return match.group() if token is None else token
+
+        return self.pattern.sub(replace, text)
+
+    def replacements(self, text, session_data):
+        # Lista de (início, fim, token) sem reescrever o texto, para quem precisa
+        # aplicar as substituições em pedaços (ex.: runs de um parágrafo do Word)
+        if self.pattern is None:
+            return []
+
+        result = []
+        for match in self.pattern.finditer(text):
+            token = self._token_for(match, session_data)
+            if token is not None:
+                result.append((match.start(), match.end(), token))
+        return result
+
+@lru_cache(maxsize=32)
+def _get_cached_engine(mask_words, detectors):
+    return MaskingEngine(mask_words, detectors)
+
+def get_masking_engine(mask_words, detectors=None):
+    # O mesmo conjunto de palavras e detectores é reutilizado em todas as
+    # células/parágrafos de um documento, então o regex combinado é compilado
+    # uma única vez
+    key = tuple(sorted({word.lower() for word in mask_words if word}))
+    return _get_cached_engine(key, normalize_detectors(detectors))
+
+def restore_tokens(text, session_data):
+    # Uma única varredura do texto; cada token encontrado é resolvido no dicionário.
+    # Tokens desconhecidos são mantidos como estão.
+    if '[' not in text:
+        return text
+    return TOKEN_PATTERN.sub(lambda match: session_data.get(match.group(), match.group()), text)
+
+
+def restore_replacements(text, session_data):
+    # Equivalente a restore_tokens, mas devolvendo (início, fim, original)
+    if '[' not in text:
+        return []
+
+    result = []
+    for match in TOKEN_PATTERN.finditer(text):
+        original = session_data.get(match.group())
+        if original is not None:
+            result.append((match.start(), match.end(), original))
+    return result
@@ -0,0 +1,93 @@
+import os
+import logging
+import threading
+from datetime import datetime, timedelta
+from utils.database import db
+from models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+# Quantidade máxima de e-mails enviados por ciclo do remetente
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', '20'))
+# Tentativas antes de o e-mail ser marcado como 'failed'
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', '6'))
+# Espera antes da primeira nova tentativa, em segundos; dobra a cada falha
+OUTBOX_RETRY_BASE = float(os.environ.get('OUTBOX_RETRY_BASE', '30'))
+OUTBOX_RETRY_MAX = float(os.environ.get('OUTBOX_RETRY_MAX', '3600'))
+# Intervalo máximo entre verificações da caixa de saída, em segundos
+OUTBOX_POLL_INTERVAL = float(os.environ.get('OUTBOX_POLL_INTERVAL', '5'))
+
+_wakeup = threading.Event()
+_sender = None
+
+def wake_outbox_sender():
+    _wakeup.set()
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(OUTBOX_RETRY_BASE * 2 ** (attempts - 1), OUTBOX_RETRY_MAX))
+
+def send_pending_emails(connection):
+    from utils.email_sender import get_email_config, build_message
+
+    # As linhas ficam bloqueadas até o commit: outros processos pulam esses e-mails
+    # (SKIP LOCKED) e, se este processo cair, eles voltam a ficar pendentes
+    emails = EmailOutbox.query.filter(
+        EmailOutbox.status == 'pending',
+        EmailOutbox.next_attempt_at <= datetime.utcnow()
+    ).order_by(EmailOutbox.next_attempt_at).with_for_update(skip_locked=True).limit(OUTBOX_BATCH_SIZE).all()
+
+    if not emails:
+        db.session.commit()
+        return 0
+
+    config = get_email_config()
+    for email in emails:
+        try:
+            if not config:
+                raise RuntimeError("Configuração de e-mail não encontrada")
+            connection.send(config, build_message(config, email.to_email, email.subject, email.body, email.html_body))
+            email.status = 'sent'
+            email.sent_at = datetime.utcnow()
+            email.last_error = None
+        except Exception as e:
+            # Descartar a conexão: o próximo envio abre uma nova
+            connection.close()
+            email.attempts += 1
+            email.last_error = str(e)
+            if email.attempts >= OUTBOX_MAX_ATTEMPTS:
+                email.status = 'failed'
+                logger.error(f"E-mail para {email.to_email} descartado após {email.attempts} tentativas: {e}")
+            else:
+                email.next_attempt_at = datetime.utcnow() + retry_delay(email.attempts)
+                logger.warning(f"Falha ao enviar e-mail para {email.to_email} (tentativa {email.attempts}): {e}")
+
+    db.session.commit()
+    return len(emails)
+
+def _sender_loop(app):
+    from utils.email_sender import SMTPConnection
+
+    connection = SMTPConnection()
+    while True:
+        sent = 0
+        try:
+            with app.app_context():
+                sent = send_pending_emails(connection)
+        except Exception as e:
+            logger.error(f"Erro no remetente de e-mails: {e}")
+
+        # Lote cheio: provavelmente há mais e-mails pendentes
+        if sent >= OUTBOX_BATCH_SIZE:
+            continue
+
+        # Acordar assim que um e-mail for enfileirado neste processo ou, no máximo,
+        # após o intervalo de verificação (e-mails de outros processos e novas tentativas)
+        _wakeup.wait(OUTBOX_POLL_INTERVAL)
+        _wakeup.clear()
+
+def start_outbox_sender(app):
+    global _sender
+    if _sender is None:
+        _sender = threading.Thread(target=_sender_loop, args=(app,), name='outbox-sender', daemon=True)
+        _sender.start()
+    return _sender
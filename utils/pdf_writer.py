@@ -0,0 +1,85 @@
+import zlib
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.utils import simpleSplit
+
+FONT_NAME = 'Helvetica'
+
+def _pdf_string(text):
+    data = text.encode('cp1252', 'replace')
+    return b'(' + data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+class StreamingPDFWriter:
+    # Escreve um PDF de texto simples página a página direto no arquivo de saída.
+    # Ao contrário do canvas do reportlab, nenhuma página fica em memória depois
+    # de escrita: só os deslocamentos dos objetos são guardados para a tabela xref.
+    # Objetos 1 a 3 (catálogo, árvore de páginas e fonte) são escritos no final.
+    def __init__(self, output, pagesize=letter, font_size=10, margin=72):
+        self.output = output
+        self.width, self.height = pagesize
+        self.font_size = font_size
+        self.leading = font_size * 1.2
+        self.margin = margin
+        self.lines_per_page = max(1, int((self.height - 2 * margin) // self.leading))
+        self.offsets = {}
+        self.page_ids = []
+        self.next_id = 4
+        self.position = 0
+        self._write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def _write(self, data):
+        self.output.write(data)
+        self.position += len(data)
+
+    def _write_object(self, object_id, body):
+        self.offsets[object_id] = self.position
+        self._write(f"{object_id} 0 obj\n".encode('ascii') + body + b'\nendobj\n')
+
+    def _allocate_id(self):
+        object_id = self.next_id
+        self.next_id += 1
+        return object_id
+
+    def _write_page(self, lines):
+        content = [f"BT /F1 {self.font_size} Tf {self.leading:.2f} TL {self.margin} {self.height - self.margin} Td".encode('ascii')]
+        for line in lines:
+            content.append(_pdf_string(line) + b" Tj T*")
+        content.append(b'ET')
+        stream = zlib.compress(b'\n'.join(content))
+
+        content_id = self._allocate_id()
+        self._write_object(content_id, f"<< /Length {len(stream)} /Filter /FlateDecode >>\nstream\n".encode('ascii') + stream + b'\nendstream')
+
+        page_id = self._allocate_id()
+        self._write_object(page_id, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {self.width:.2f} {self.height:.2f}] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode('ascii'))
+        self.page_ids.append(page_id)
+
+    def add_page(self, text):
+        # Quebra o texto em linhas que cabem na largura útil; páginas de origem com
+        # mais linhas do que cabem continuam nas páginas seguintes, sem perda de conteúdo
+        max_width = self.width - 2 * self.margin
+        lines = []
+        for paragraph in (text or '').split('\n'):
+            lines.extend(simpleSplit(paragraph, FONT_NAME, self.font_size, max_width) or [''])
+
+        for start in range(0, max(len(lines), 1), self.lines_per_page):
+            self._write_page(lines[start:start + self.lines_per_page])
+
+    def close(self):
+        if not self.page_ids:
+            self._write_page([])
+
+        self._write_object(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+        kids = ' '.join(f"{page_id} 0 R" for page_id in self.page_ids)
+        self._write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} >>".encode('ascii'))
+        self._write_object(3, f"<< /Type /Font /Subtype /Type1 /BaseFont /{FONT_NAME} /Encoding /WinAnsiEncoding >>".encode('ascii'))
+
+        xref_position = self.position
+        size = self.next_id
+        entries = [b'0000000000 65535 f \n']
+        for object_id in range(1, size):
+            entries.append(f"{self.offsets[object_id]:010d} 00000 n \n".encode('ascii'))
+        self._write(f"xref\n0 {size}\n".encode('ascii') + b''.join(entries))
+        self._write(f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref_position}\n%%EOF\n".encode('ascii'))
@@ -1,4 +1,5 @@
 from models.system_config import SystemConfig
+from utils.config_cache import config_cache, notify_config_changed
 
 def get_system_config():
     config = SystemConfig.query.first()
@@ -10,13 +11,39 @@ def get_system_config():
         db.session.commit()
     return config
 
-def is_local_registration_allowed():
+def _load_system_settings():
     config = get_system_config()
-    return config.allow_local_registration
+    return {
+        'allow_local_registration': config.allow_local_registration,
+        'enabled_detectors': config.enabled_detectors
+    }
+
+# Leituras frequentes (página de registro, cada mascaramento) usam o cache
+_system_settings = config_cache('system_config', _load_system_settings)
+
+def is_local_registration_allowed():
+    return _system_settings.get()['allow_local_registration']
 
 def set_local_registration_allowed(allowed):
     config = get_system_config()
     config.allow_local_registration = allowed
     from utils.database import db
     db.session.commit()
+    notify_config_changed('system_config')
+    return config
+
+def get_enabled_detectors():
+    from utils.detectors import normalize_detectors
+    enabled_detectors = _system_settings.get()['enabled_detectors']
+    if enabled_detectors is None:
+        return normalize_detectors(None)
+    return normalize_detectors(name for name in enabled_detectors.split(',') if name)
+
+def set_enabled_detectors(names):
+    from utils.detectors import normalize_detectors
+    config = get_system_config()
+    config.enabled_detectors = ','.join(normalize_detectors(names))
+    from utils.database import db
+    db.session.commit()
+    notify_config_changed('system_config')
     return config
\ No newline at end of file
@@ -0,0 +1,106 @@
+import uuid
+from datetime import datetime, date
+from collections import Counter
+from sqlalchemy import event, text, func
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+from utils.database import db
+from models import User, DocumentHistory, UsageStats
+
+# Agrupamentos aceitos pela consulta de estatísticas
+STATS_GROUPS = {
+    'day': UsageStats.day,
+    'user': UsageStats.user_id,
+    'format': UsageStats.file_format,
+    'operation': UsageStats.operation,
+}
+
+@event.listens_for(Session, 'after_flush')
+def _count_new_history(session, flush_context):
+    # Cada registro novo de histórico incrementa a linha correspondente de
+    # usage_stats na mesma transação: se a operação for desfeita, a contagem também é
+    counts = Counter()
+    for record in session.new:
+        if isinstance(record, DocumentHistory):
+            day = (record.timestamp or datetime.utcnow()).date()
+            counts[(day, record.user_id, record.file_format, record.operation)] += 1
+
+    if not counts:
+        return
+
+    stmt = insert(UsageStats.__table__).values([
+        {'day': day, 'user_id': user_id, 'file_format': file_format, 'operation': operation, 'count': count}
+        for (day, user_id, file_format, operation), count in counts.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['day', 'user_id', 'file_format', 'operation'],
+        set_={'count': UsageStats.__table__.c.count + stmt.excluded['count']}
+    )
+    session.connection().execute(stmt)
+
+def rebuild_usage_stats():
+    # Recalcula toda a tabela a partir do histórico. O bloqueio de document_history
+    # impede inserções durante o recálculo, para que nenhuma seja contada duas vezes
+    # ou perdida; leituras continuam liberadas.
+    db.session.execute(text('LOCK TABLE document_history IN SHARE MODE'))
+    db.session.execute(text('DELETE FROM usage_stats'))
+    result = db.session.execute(text('''
+        INSERT INTO usage_stats (day, user_id, file_format, operation, count)
+        SELECT CAST(timestamp AS DATE), user_id, file_format, operation, COUNT(*)
+        FROM document_history
+        WHERE timestamp IS NOT NULL
+        GROUP BY CAST(timestamp AS DATE), user_id, file_format, operation
+    '''))
+    db.session.commit()
+    return result.rowcount
+
+def usage_stats(args):
+    # Soma das contagens agrupada pelos campos pedidos em 'group_by' (separados por
+    # vírgula); o custo depende do número de dias, usuários e formatos, não do histórico
+    group_by = [name.strip() for name in args.get('group_by', 'day').split(',') if name.strip()]
+    for name in group_by:
+        if name not in STATS_GROUPS:
+            raise ValueError(f"Agrupamento inválido: {name}")
+
+    columns = [STATS_GROUPS[name].label(name) for name in group_by]
+    if 'user' in group_by:
+        columns.append(User.username.label('username'))
+    query = db.session.query(*columns, func.sum(UsageStats.count).label('count'))
+    if 'user' in group_by:
+        query = query.join(User, User.id == UsageStats.user_id)
+
+    if args.get('user_id'):
+        try:
+            query = query.filter(UsageStats.user_id == uuid.UUID(args['user_id']))
+        except ValueError:
+            raise ValueError("Parâmetro 'user_id' inválido")
+    if args.get('operation'):
+        query = query.filter(UsageStats.operation == args['operation'])
+    if args.get('format'):
+        query = query.filter(UsageStats.file_format == args['format'].lower())
+    try:
+        if args.get('date_from'):
+            query = query.filter(UsageStats.day >= date.fromisoformat(args['date_from']))
+        if args.get('date_to'):
+            query = query.filter(UsageStats.day <= date.fromisoformat(args['date_to']))
+    except ValueError:
+        raise ValueError("Data inválida; use AAAA-MM-DD")
+
+    if columns:
+        query = query.group_by(*columns).order_by(*columns)
+
+    items = []
+    for row in query.all():
+        item = {}
+        for name in group_by:
+            value = getattr(row, name)
+            if name == 'day':
+                value = value.isoformat()
+            elif name == 'user':
+                value = str(value)
+            item[name] = value
+        if 'user' in group_by:
+            item['username'] = row.username
+        item['count'] = int(row.count or 0)
+        items.append(item)
+    return {'items': items}
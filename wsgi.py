@@ -0,0 +1,14 @@
+from dotenv import load_dotenv
+
+# Antes dos módulos da aplicação, que leem as configurações ao serem importados
+load_dotenv()
+
+from app import create_app
+from utils.file_processor import preload_document_libraries
+
+# Ponto de entrada WSGI para produção: gunicorn -c gunicorn.conf.py wsgi:app
+app = create_app()
+
+# Com PRELOAD_DOCUMENT_LIBRARIES, as bibliotecas dos formatos indicados são
+# carregadas no processo mestre e compartilhadas com os workers
+preload_document_libraries()